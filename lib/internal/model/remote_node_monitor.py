@@ -7,6 +7,13 @@ from lib.external.mCommon3.model.skyla import SkylaConfig
 
 class BluesConfig(DictAdaptable):
     Serial: SerialConfig
+    UsbSerial: str      # USB serial number of the card, empty to learn it from relay power-on order
+
+
+class PortDiscoveryConfig(DictAdaptable):
+    PowerOffSeconds: float      # boards and radios held off before power-on
+    TimeoutSeconds: float       # how long a card may take to enumerate after its relay switches on
+    PortMapPath: str            # learned board -> USB serial numbers, empty to not remember them
 
 
 class BEBoardConfig(DictAdaptable):
@@ -18,19 +25,133 @@ class BEBoardConfig(DictAdaptable):
     Blues: BluesConfig
 
 
+class MollyBoardConfig(DictAdaptable):
+    Name: str           # e.g. Skyla1, also the board name in the results store
+    Command: str        # byte the Nucleo firmware starts the board's Molly session on, e.g. p
+    Prefix: str         # line prefix of the board's B|/A| report lines, e.g. S1|
+    Molly: bool
+    Settings: SkylaConfig
+
+
+class MonitorChannelConfig(DictAdaptable):
+    Name: str           # logger name, e.g. skyla1
+    Prefix: str         # line prefix the Nucleo firmware tags the board with, e.g. S1|
+    LogFilePath: str
+    Source: str         # Name of the NucleoPorts entry the board arrives on, defaults to Nucleo
+
+
+class NucleoPortConfig(DictAdaptable):
+    Name: str
+    Port: str
+    Baud: int
+
+
 class GoogleDriveConfig(DictAdaptable):
     Mode: int           # 1 = frequency, 2 = daily at X hour
     SyncFrequency: int
     ResetDailyTime: int
     LocalLogPath: str
     RemoteLogPath: str
+    ManifestPath: str   # defaults to LocalLogPath/.sync_manifest.json
+    Compression: str    # gzip, zstd or empty to upload rotated logs uncompressed
+    CompressionCpuBudget: float     # fraction of one core the compressor may use
+    Transport: str      # rclone (default), or local to copy into RemoteLogPath as a plain directory for testing
+    UploadWorkers: int
+    BandwidthKBps: int  # shared by all upload workers, empty for no limit
+    RetryInitialSeconds: float      # a failed upload is retried after this, doubling up to RetryMaxSeconds
+    RetryMaxSeconds: float
+
+
+class GroupCommitConfig(DictAdaptable):
+    Enabled: bool               # board/blues log files are written in page-sized batches
+    PageSize: int
+    MaxLatencySeconds: float    # a partial page is written once its oldest line is this old
+    FsyncIntervalSeconds: float
+
+
+class ProgrammingConfig(DictAdaptable):
+    SkipIdentical: bool         # skip boards whose last verified flash was the same image
+    Attempts: int
+    CachePath: str              # board -> digest of last verified image, defaults to hex_files/.flash_cache.json
+    ResultsPath: str            # JSON lines of per-board timings and attempts, empty to disable
+
+
+class LoggingConfig(DictAdaptable):
+    Queued: bool                # board/blues loggers write through a background batching writer
+    QueueSize: int
+    BatchSize: int
+    FlushIntervalSeconds: float
+    GroupCommit: GroupCommitConfig
+
+
+class LogStoreConfig(DictAdaptable):
+    Path: str                   # empty disables the time-indexed store
+    SegmentBytes: int
+    IndexIntervalBytes: int
+
+
+class MetricsConfig(DictAdaptable):
+    Enabled: bool
+    Host: str
+    MonitorPort: int            # Prometheus text endpoint at http://Host:Port/metrics, 0 for summary lines only
+    ControllerPort: int
+    SummaryIntervalSeconds: int
+
+
+class AnomalyConfig(DictAdaptable):
+    Enabled: bool
+    LogFilePath: str            # defaults to LocalLogPath/alerts.log
+    GapFactor: float            # silent once quiet for this many normal inter-arrival intervals
+    MinGapSeconds: float
+    SpikeFactor: float          # flood once the short-window rate is this many times the learned rate
+    RateWindowSeconds: float
+    MinSpikeLines: int
+    ResetPatterns: list         # case-insensitive regexes for startup banners/reset messages
+    ResetWindowSeconds: float
+    ResetLoopCount: int         # resets within the window that raise a reset_loop alert
+
+
+class LineBufferConfig(DictAdaptable):
+    Enabled: bool               # recent lines per board kept in memory and served to main_tail.py
+    Lines: int                  # per board
+    SocketPath: str
+
+
+class ProfilingConfig(DictAdaptable):
+    Enabled: bool               # SIGUSR1 or touching Path/<service>.profile records a sampling profile,
+                                # SIGUSR2 or creating Path/<service>.spans turns on loop timing spans
+    Path: str                   # profiles and flag files, defaults to LocalLogPath/profiles
+    ProfileSeconds: float
+    SampleIntervalMs: float
+    SummaryIntervalSeconds: int
+    Spans: bool                 # loop timing spans on from startup
+
+
+class CaptureConfig(DictAdaptable):
+    Enabled: bool               # record raw Nucleo bytes for main_replay.py
+    Path: str
 
 
 class RemoteNodeMonitorConfig(DictAdaptable):
     BluesTraceFrequencyMinutes: int
+    BluesSummaryIntervalSeconds: int    # parsed signal/registration summary per card next to its raw log, 0 disables
+    PortDiscovery: PortDiscoveryConfig
+    Logging: LoggingConfig
+    LogStore: LogStoreConfig
+    Metrics: MetricsConfig
+    Capture: CaptureConfig
+    Anomaly: AnomalyConfig
+    Profiling: ProfilingConfig
+    LineBuffer: LineBufferConfig
+    MollyCachePath: str         # generated Molly payloads keyed by settings hash, empty to always regenerate
+    MollyResultsPath: str       # per-run before/after values, defaults to LocalLogPath/molly_results.jsonl
+    MollyBoards: list           # MollyBoardConfig entries, defaults to Skyla1 (p, S1|) and Skyla2 (q, S2|)
     Nucleo: SerialConfig
+    NucleoPorts: list           # extra NucleoPortConfig entries, the Nucleo port is always available as "Nucleo"
+    MonitorChannels: list       # MonitorChannelConfig entries, defaults to Skyla1/Creed1/Skyla2/Creed2 on Nucleo
     GoogleDrive: GoogleDriveConfig
     Programmer: AVRDudeConfig
+    Programming: ProgrammingConfig
     Skyla1: BEBoardConfig
     Creed1: BEBoardConfig
     Skyla2: BEBoardConfig
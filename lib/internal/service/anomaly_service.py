@@ -0,0 +1,183 @@
+import json
+import re
+import threading
+import time
+
+
+class SlidingCounter:
+    # A fixed ring of per-bucket counts, so a sliding window costs the same memory however busy the channel is
+    def __init__(self, window_seconds, buckets=60):
+        self.bucket_seconds = window_seconds / buckets
+        self.counts = [0] * buckets
+        self.current = None
+
+    def advance(self, now):
+        bucket = int(now / self.bucket_seconds)
+        if self.current is None:
+            self.current = bucket
+        elif bucket != self.current:
+            for index in range(self.current + 1, min(bucket, self.current + len(self.counts)) + 1):
+                self.counts[index % len(self.counts)] = 0
+            self.current = bucket
+        return bucket % len(self.counts)
+
+    def add(self, now, count=1):
+        self.counts[self.advance(now)] += count
+
+    def total(self, now):
+        self.advance(now)
+        return sum(self.counts)
+
+
+class PatternCounter:
+    # Counts lines matching startup banner/reset patterns. Read by the detector thread, written by the read loop.
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self.pattern = re.compile("|".join(f"(?:{pattern})" for pattern in patterns), re.IGNORECASE)
+        self.count = 0
+        self.last_line = None
+
+
+def make_pattern_emit(emit, counter):
+    search = counter.pattern.search
+
+    def pattern_emit(text):
+        if search(text):
+            counter.count += 1
+            counter.last_line = text
+        emit(text)
+    return pattern_emit
+
+
+class ChannelDetector:
+    # Watches one IngestChannel from outside the read loop by sampling its line counter: the inter-arrival interval
+    # and the rate are EWMAs, the short rate window and reset window are fixed rings.
+    def __init__(self, source, channel, patterns=None, gap_factor=5.0, min_gap=30.0, spike_factor=5.0,
+                 rate_window=10.0, min_spike_lines=50, reset_window=3600.0, reset_loop_count=3, warmup_samples=5,
+                 alpha=0.1, clock=time.monotonic):
+        self.source = source
+        self.channel = channel
+        self.patterns = patterns
+        self.warmup_samples = warmup_samples
+        self.alpha = alpha
+        self.clock = clock
+        self.rate_window = None
+        self.reset_window = None
+        self.configure(gap_factor, min_gap, spike_factor, rate_window, min_spike_lines, reset_window,
+                       reset_loop_count)
+
+        now = clock()
+        self.last_lines = channel.lines
+        self.last_change = now
+        self.last_check = now
+        self.interval = None
+        self.interval_samples = 0
+        self.baseline_rate = None
+        self.counted_patterns = patterns
+        self.last_resets = patterns.count if patterns else 0
+        self.silent = False
+        self.flooding = False
+
+    def configure(self, gap_factor=5.0, min_gap=30.0, spike_factor=5.0, rate_window=10.0, min_spike_lines=50,
+                  reset_window=3600.0, reset_loop_count=3):
+        # Thresholds can change while running; the learned interval and baseline rate carry over
+        self.gap_factor = gap_factor
+        self.min_gap = min_gap
+        self.spike_factor = spike_factor
+        self.min_spike_lines = min_spike_lines
+        self.reset_loop_count = reset_loop_count
+        if rate_window != self.rate_window:
+            self.rate_window = rate_window
+            self.recent = SlidingCounter(rate_window, buckets=10)
+        if reset_window != self.reset_window:
+            self.reset_window = reset_window
+            self.resets = SlidingCounter(reset_window)
+
+    def alert(self, kind, **fields):
+        return dict({"source": self.source, "channel": self.channel.name, "alert": kind}, **fields)
+
+    def check(self):
+        now = self.clock()
+        alerts = []
+        lines = self.channel.lines
+        new_lines = lines - self.last_lines
+        elapsed = now - self.last_check
+        self.last_check = now
+
+        if new_lines:
+            gap = now - self.last_change
+            if self.silent:
+                self.silent = False
+                alerts.append(self.alert("resumed", silent_seconds=round(gap, 1)))
+            # Sampled once a second: spread the time since the last change over the lines that arrived in it
+            interval = gap / new_lines
+            self.interval = interval if self.interval is None else \
+                self.interval + self.alpha * (interval - self.interval)
+            self.interval_samples += 1
+            self.last_change = now
+            self.last_lines = lines
+            self.recent.add(now, new_lines)
+        elif not self.silent and self.interval_samples >= self.warmup_samples:
+            threshold = max(self.gap_factor * self.interval, self.min_gap)
+            if now - self.last_change > threshold:
+                self.silent = True
+                alerts.append(self.alert("silent", silent_seconds=round(now - self.last_change, 1),
+                                         normal_interval=round(self.interval, 2)))
+
+        rate = self.recent.total(now) / self.rate_window
+        fast = False
+        if self.baseline_rate is not None:
+            fast = rate > self.spike_factor * self.baseline_rate
+            spike = fast and rate * self.rate_window >= self.min_spike_lines
+            if spike and not self.flooding:
+                self.flooding = True
+                alerts.append(self.alert("flood", lines_per_second=round(rate, 1),
+                                         normal_lines_per_second=round(self.baseline_rate, 2)))
+            elif not spike and self.flooding:
+                self.flooding = False
+                alerts.append(self.alert("flood_over", lines_per_second=round(rate, 1)))
+        if self.baseline_rate is None:
+            if self.interval_samples >= self.warmup_samples and self.interval > 0:
+                self.baseline_rate = 1.0 / self.interval
+        elif not fast and elapsed > 0:
+            # The baseline learns slowly and not at all while the rate is high, so a long flood does not become normal
+            self.baseline_rate += self.alpha * 0.1 * (new_lines / elapsed - self.baseline_rate)
+
+        patterns = self.patterns
+        if patterns is not self.counted_patterns:
+            # Swapped on a settings reload: the new counter starts from zero, count from its own total
+            self.counted_patterns = patterns
+            self.last_resets = patterns.count if patterns else 0
+        if patterns is not None:
+            resets = patterns.count
+            if resets != self.last_resets:
+                # A multi-line banner within one sample is one reset
+                self.resets.add(now)
+                matched = resets - self.last_resets
+                self.last_resets = resets
+                in_window = self.resets.total(now)
+                alerts.append(self.alert("reset", line=patterns.last_line, matched_lines=matched,
+                                         resets_in_window=in_window))
+                if in_window >= self.reset_loop_count:
+                    alerts.append(self.alert("reset_loop", resets_in_window=in_window))
+        return alerts
+
+
+class AnomalyMonitor(threading.Thread):
+    def __init__(self, detectors, emit, interval=1.0):
+        super().__init__(name="anomaly_monitor", daemon=True)
+        self.detectors = detectors
+        self.emit = emit
+        self.interval = interval
+        self.alerts = 0
+        self.stop_event = threading.Event()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            for detector in self.detectors:
+                for alert in detector.check():
+                    self.alerts += 1
+                    self.emit(json.dumps(alert, separators=(',', ':')))
+
+    def stop(self):
+        self.stop_event.set()
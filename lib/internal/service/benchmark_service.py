@@ -0,0 +1,308 @@
+from array import array
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import selectors
+import tempfile
+import time
+import tty
+
+from lib.internal.service.serial_ingest_service import IngestChannel, SerialLineIngest
+
+BENCHMARK_PREFIXES = ["S1|", "C1|", "S2|", "C2|"]
+
+
+class MemorySerialPort(io.RawIOBase):
+    # Stands in for serial.Serial: readline() is inherited from RawIOBase and pulls one byte per read() call,
+    # which is what pyserial does on a real port.
+    def __init__(self, data):
+        self.data = memoryview(data)
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    @property
+    def in_waiting(self):
+        return len(self.data) - self.position
+
+    def readinto(self, b):
+        count = min(len(b), len(self.data) - self.position)
+        if count <= 0:
+            raise EOFError
+        b[:count] = self.data[self.position:self.position + count]
+        self.position += count
+        return count
+
+
+def generate_monitor_traffic(line_count, line_size=80):
+    lines = []
+    for i in range(line_count):
+        prefix = BENCHMARK_PREFIXES[i % len(BENCHMARK_PREFIXES)]
+        body = f"{i:08d} "
+        lines.append(prefix + body + "x" * max(0, line_size - len(prefix) - len(body) - 2) + "\r\n")
+    return "".join(lines).encode('utf-8')
+
+
+def run_legacy_monitor_loop(port, sinks):
+    # Copy of the readline()/print/if-elif loop that run_monitor_application used before SerialLineIngest
+    while 1:
+        try:
+            line = port.readline()
+        except EOFError:
+            return
+        if line:
+            print(line)
+            try:
+                line = line.decode('utf-8').strip()
+            except:
+                pass
+            prefix = line[:3]
+            if prefix == "S1|":
+                sinks[0](line[3:])
+            elif prefix == "C1|":
+                sinks[1](line[3:])
+            elif prefix == "S2|":
+                sinks[2](line[3:])
+            elif prefix == "C2|":
+                sinks[3](line[3:])
+
+
+def run_ingest_monitor_loop(port, sinks):
+    ingest = SerialLineIngest(port, {prefix.encode('utf-8'): sink for prefix, sink in zip(BENCHMARK_PREFIXES, sinks)})
+    try:
+        ingest.run_forever()
+    except EOFError:
+        return
+
+
+def measure_lines_per_second(loop, data, line_count):
+    counts = [0] * len(BENCHMARK_PREFIXES)
+
+    def make_sink(index):
+        def sink(text):
+            counts[index] += 1
+        return sink
+
+    sinks = [make_sink(i) for i in range(len(BENCHMARK_PREFIXES))]
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        loop(MemorySerialPort(data), sinks)
+        elapsed = time.perf_counter() - start
+
+    if sum(counts) != line_count:
+        raise RuntimeError(f"{loop.__name__} routed {sum(counts)} of {line_count} lines")
+    return line_count / elapsed
+
+
+def run_ingest_benchmark(line_count=200000, line_size=80, repeat=3):
+    data = generate_monitor_traffic(line_count, line_size)
+
+    legacy = max(measure_lines_per_second(run_legacy_monitor_loop, data, line_count) for _ in range(repeat))
+    ingest = max(measure_lines_per_second(run_ingest_monitor_loop, data, line_count) for _ in range(repeat))
+
+    print(f"Lines: {line_count} x {line_size} bytes, best of {repeat}")
+    print(f"Legacy readline loop:   {legacy:12,.0f} lines/sec")
+    print(f"SerialLineIngest:       {ingest:12,.0f} lines/sec")
+    print(f"Speedup:                {ingest / legacy:12.1f}x")
+    return legacy, ingest
+
+
+def monitor_traffic_line(seq, prefix, line_size):
+    body = f"{prefix}{seq:010d} {time.monotonic_ns():019d} "
+    return (body + "x" * max(0, line_size - len(body) - 2) + "\r\n").encode('utf-8')
+
+
+def blues_traffic_line(seq, prefix, line_size):
+    body = f'{{"seq":{seq},"t":{time.monotonic_ns()},"pad":"'
+    return (body + "x" * max(0, line_size - len(body) - 4) + '"}\r\n').encode('utf-8')
+
+
+def generate_pty_traffic(master_fds, prefixes, make_line, rate, line_size, duration, results):
+    # Runs in its own process so the parent's CPU time is the monitor side only. Writes are non-blocking: a full pty
+    # buffer drops the line, the same way an overrun UART would.
+    for fd in master_fds:
+        os.set_blocking(fd, False)
+    sent = 0
+    dropped = 0
+    start = time.monotonic()
+    while 1:
+        elapsed = time.monotonic() - start
+        if elapsed >= duration:
+            break
+        due = int(elapsed * rate)
+        while sent + dropped < due:
+            seq = sent + dropped
+            fd = master_fds[seq % len(master_fds)]
+            line = make_line(seq, prefixes[seq % len(prefixes)], line_size)
+            try:
+                written = os.write(fd, line)
+            except BlockingIOError:
+                written = 0
+            if written == len(line):
+                sent += 1
+            else:
+                dropped += 1
+        time.sleep(0.001)
+    results.put((sent, dropped))
+
+
+class BenchmarkSink:
+    # Logger stand-in for the pipeline under test: forwards to the real logger, then records end-to-end latency
+    def __init__(self, logger, parse):
+        self.logger = logger
+        self.parse = parse
+        self.received = 0
+        self.latencies = array('d')
+
+    def info(self, message):
+        self.logger.info(message)
+        sent_ns = self.parse(message)
+        if sent_ns is not None:
+            self.latencies.append((time.monotonic_ns() - sent_ns) / 1e9)
+        self.received += 1
+
+
+def parse_monitor_line(text):
+    try:
+        return int(text[11:30])
+    except ValueError:
+        return None
+
+
+def parse_blues_line(line):
+    try:
+        return json.loads(line)["t"]
+    except (ValueError, KeyError):
+        return None
+
+
+def open_pty_ports(count, baud=115200):
+    import serial
+
+    masters = []
+    ports = []
+    for _ in range(count):
+        master_fd, slave_fd = os.openpty()
+        tty.setraw(master_fd)
+        tty.setraw(slave_fd)
+        ports.append(serial.Serial(os.ttyname(slave_fd), baud, timeout=0.2))
+        os.close(slave_fd)
+        masters.append(master_fd)
+    return masters, ports
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def report_pty_benchmark(name, rate, line_size, duration, sent, dropped, sinks, cpu_seconds):
+    received = sum(sink.received for sink in sinks)
+    latencies = [latency for sink in sinks for latency in sink.latencies]
+    lost = sent + dropped - received
+    result = {
+        "offered_lines_per_sec": rate,
+        "line_size": line_size,
+        "sustained_lines_per_sec": received / duration,
+        "sent": sent,
+        "received": received,
+        "lost": lost,
+        "loss_percent": 100 * lost / (sent + dropped) if sent + dropped else 0.0,
+        "latency_p50_ms": percentile(latencies, 0.5) * 1000,
+        "latency_p99_ms": percentile(latencies, 0.99) * 1000,
+        "latency_max_ms": max(latencies) * 1000 if latencies else 0.0,
+        "cpu_us_per_line": cpu_seconds / received * 1e6 if received else 0.0,
+    }
+    print(f"{name}: {rate} lines/sec offered, {line_size} byte lines, {duration}s")
+    for key, value in result.items():
+        print(f"  {key:24s} {value:12,.3f}" if isinstance(value, float) else f"  {key:24s} {value:12,}")
+    return result
+
+
+def run_pty_traffic(master_fds, prefixes, make_line, rate, line_size, duration):
+    results = multiprocessing.get_context('fork').Queue()
+    generator = multiprocessing.get_context('fork').Process(
+        target=generate_pty_traffic, args=(master_fds, prefixes, make_line, rate, line_size, duration, results),
+        daemon=True)
+    generator.start()
+    return generator, results
+
+
+def run_monitor_pty_benchmark(rate=2000, line_size=80, duration=10.0, drain_seconds=1.0):
+    from lib.internal.service.remote_node_monitor_service import setup_logger
+
+    masters, ports = open_pty_ports(1)
+    log_directory = tempfile.mkdtemp(prefix="rnm_bench_")
+    sinks = []
+    routes = {}
+    for prefix in BENCHMARK_PREFIXES:
+        name = f"bench_{prefix[:2].lower()}"
+        logger = setup_logger(name, os.path.join(log_directory, name + ".log"), console=0)
+        sink = BenchmarkSink(logger, parse_monitor_line)
+        sinks.append(sink)
+        routes[prefix.encode('utf-8')] = IngestChannel(name, sink.info)
+    ingest = SerialLineIngest(ports[0], routes)
+
+    cpu_start = time.process_time()
+    generator, results = run_pty_traffic(masters, BENCHMARK_PREFIXES, monitor_traffic_line, rate, line_size, duration)
+    with selectors.DefaultSelector() as selector:
+        selector.register(ports[0].fileno(), selectors.EVENT_READ)
+        idle_since = None
+        while generator.is_alive() or idle_since is None or time.monotonic() - idle_since < drain_seconds:
+            if selector.select(0.1):
+                ingest.poll()
+                idle_since = None
+            elif idle_since is None:
+                idle_since = time.monotonic()
+    cpu_seconds = time.process_time() - cpu_start
+    sent, dropped = results.get()
+
+    for port in ports:
+        port.close()
+    for fd in masters:
+        os.close(fd)
+    return report_pty_benchmark("Monitor (SerialLineIngest)", rate, line_size, duration, sent, dropped, sinks,
+                                cpu_seconds)
+
+
+def run_controller_pty_benchmark(rate=200, line_size=120, duration=10.0, drain_seconds=1.0):
+    from lib.internal.service.blues_service import BluesPortReader
+    from lib.internal.service.remote_node_monitor_service import setup_logger
+
+    masters, ports = open_pty_ports(2)
+    log_directory = tempfile.mkdtemp(prefix="rnm_bench_")
+    sinks = []
+    readers = []
+    for i, port in enumerate(ports):
+        name = f"bench_blues{i + 1}"
+        logger = setup_logger(name, os.path.join(log_directory, name + ".log"), console=0)
+        sink = BenchmarkSink(logger, parse_blues_line)
+        sinks.append(sink)
+        readers.append(BluesPortReader(name, port, sink))
+
+    cpu_start = time.process_time()
+    for reader in readers:
+        reader.start()
+    generator, results = run_pty_traffic(masters, [""], blues_traffic_line, rate, line_size, duration)
+    generator.join()
+    received = -1
+    while received != sum(sink.received for sink in sinks):
+        received = sum(sink.received for sink in sinks)
+        time.sleep(drain_seconds)
+    for reader in readers:
+        reader.stop()
+        reader.join()
+    cpu_seconds = time.process_time() - cpu_start
+    sent, dropped = results.get()
+
+    for port in ports:
+        port.close()
+    for fd in masters:
+        os.close(fd)
+    return report_pty_benchmark("Controller (BluesPortReader x2)", rate, line_size, duration, sent, dropped, sinks,
+                                cpu_seconds)
@@ -0,0 +1,297 @@
+import json
+import re
+import threading
+import time
+
+from lib.internal.service.serial_ingest_service import IngestChannel
+
+BLUES_TRACE_REQUEST = b'{"req":"card.trace","trace":"+mdmmax", "mode":"on"}\r\n'
+
+
+# Modem responses as they appear in +mdmmax trace lines, wherever the trace puts them in the line
+CSQ_PATTERN = re.compile(r'\+CSQ: *(\d+), *(\d+)')
+CESQ_PATTERN = re.compile(r'\+CESQ: *(\d+), *(\d+), *(\d+), *(\d+), *(\d+), *(\d+)')
+QCSQ_PATTERN = re.compile(r'\+QCSQ: *"([^"]+)"((?:, *-?\d+)*)')
+CEREG_PATTERN = re.compile(r'\+C(?:E|G)?REG: *(\d+)(?:, *(\d+))?')
+COPS_PATTERN = re.compile(r'\+COPS: *\d+, *\d+, *"([^"]*)"(?:, *(\d+))?')
+ERROR_PATTERN = re.compile(r'\+CM[ES] ERROR: *([^\r\n]*)|\bERROR\b')
+
+# 3GPP registration states: 1 home, 5 roaming; 2 searching; 0, 3, 4 not registered
+REGISTERED_STATES = {1, 5}
+REGISTRATION_STATES = {0: "idle", 1: "home", 2: "searching", 3: "denied", 4: "unknown", 5: "roaming"}
+
+
+class RollingStat:
+    # Count, min, max and mean of one value over a summary window, in constant memory
+    __slots__ = ('count', 'total', 'min', 'max', 'last')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.last = None
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.last = value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def summary(self):
+        if not self.count:
+            return None
+        return {"n": self.count, "min": self.min, "max": self.max, "mean": round(self.total / self.count, 1),
+                "last": self.last}
+
+
+class BluesTraceParser:
+    # Turns the raw card.trace stream into per-card signal, registration and error aggregates as lines arrive. Only
+    # the current window's aggregates and the registration state are kept, however long the card runs.
+    def __init__(self, name, emit, summary_interval=60.0, clock=time.monotonic):
+        self.name = name
+        self.emit = emit
+        self.summary_interval = summary_interval
+        self.clock = clock
+        self.next_summary = clock() + summary_interval
+
+        self.registration = None
+        self.searching_since = clock()
+        self.operator = None
+        self.access_technology = None
+        self.last_error = None
+        self.reset_window()
+
+    def reset_window(self):
+        self.lines = 0
+        self.json_responses = 0
+        self.json_errors = 0
+        self.trace_lines = 0
+        self.errors = 0
+        self.registrations = 0
+        self.deregistrations = 0
+        self.rssi = RollingStat()
+        self.rsrp = RollingStat()
+        self.rsrq = RollingStat()
+        self.sinr = RollingStat()
+        self.attach_seconds = RollingStat()
+
+    def feed(self, line):
+        self.lines += 1
+        text = line.decode('utf-8', 'replace').strip() if isinstance(line, bytes) else line.strip()
+        if text.startswith('{'):
+            self.parse_response(text)
+        elif '+' in text or 'ERROR' in text:
+            self.trace_lines += 1
+            self.parse_trace(text)
+        self.maybe_summarize()
+
+    def parse_response(self, text):
+        try:
+            response = json.loads(text)
+        except ValueError:
+            self.json_errors += 1
+            return
+        self.json_responses += 1
+        if isinstance(response, dict) and "err" in response:
+            self.errors += 1
+            self.last_error = str(response["err"])[:120]
+
+    def parse_trace(self, text):
+        match = CSQ_PATTERN.search(text)
+        if match and int(match.group(1)) != 99:
+            self.rssi.add(-113 + 2 * int(match.group(1)))
+
+        match = CESQ_PATTERN.search(text)
+        if match:
+            rsrq, rsrp = int(match.group(5)), int(match.group(6))
+            if rsrq != 255:
+                self.rsrq.add(-20 + rsrq * 0.5)
+            if rsrp != 255:
+                self.rsrp.add(-141 + rsrp)
+
+        match = QCSQ_PATTERN.search(text)
+        if match:
+            values = [int(value) for value in match.group(2).replace(' ', '').split(',') if value]
+            self.access_technology = match.group(1)
+            # "eMTC"/"NBIoT"/"LTE": RSSI, RSRP, SINR, RSRQ; "GSM": RSSI only
+            for stat, value in zip((self.rssi, self.rsrp, self.sinr, self.rsrq), values):
+                if stat is self.sinr:
+                    # Reported in 1/5 dB steps, 0..250 for -20..+30 dB
+                    value = round(value / 5 - 20, 1)
+                stat.add(value)
+
+        match = CEREG_PATTERN.search(text)
+        if match:
+            # Unsolicited +CEREG: <stat>, or the read response +CEREG: <n>,<stat>
+            state = int(match.group(2) if match.group(2) is not None else match.group(1))
+            self.update_registration(state)
+
+        match = COPS_PATTERN.search(text)
+        if match:
+            self.operator = match.group(1)
+
+        match = ERROR_PATTERN.search(text)
+        if match:
+            self.errors += 1
+            self.last_error = (match.group(1) or "ERROR").strip()[:120]
+
+    def update_registration(self, state):
+        registered = state in REGISTERED_STATES
+        was_registered = self.registration in REGISTERED_STATES
+        if registered and not was_registered:
+            self.registrations += 1
+            if self.searching_since is not None:
+                self.attach_seconds.add(round(self.clock() - self.searching_since, 1))
+                self.searching_since = None
+        elif not registered and was_registered:
+            self.deregistrations += 1
+        if not registered and self.searching_since is None:
+            self.searching_since = self.clock()
+        self.registration = state
+
+    def maybe_summarize(self):
+        if self.summary_interval and self.clock() >= self.next_summary:
+            self.summarize()
+            self.next_summary += self.summary_interval
+            while self.next_summary <= self.clock():
+                self.next_summary += self.summary_interval
+
+    def summarize(self):
+        record = {
+            "card": self.name,
+            "window": self.summary_interval,
+            "lines": self.lines,
+            "json": self.json_responses,
+            "trace": self.trace_lines,
+            "errors": self.errors,
+            "registration": REGISTRATION_STATES.get(self.registration, self.registration),
+            "registrations": self.registrations,
+            "deregistrations": self.deregistrations,
+        }
+        for key, stat in (("rssi", self.rssi), ("rsrp", self.rsrp), ("rsrq", self.rsrq), ("sinr", self.sinr),
+                          ("attach_seconds", self.attach_seconds)):
+            value = stat.summary()
+            if value is not None:
+                record[key] = value
+        if self.json_errors:
+            record["bad_json"] = self.json_errors
+        if self.errors:
+            record["last_error"] = self.last_error
+        if self.operator:
+            record["operator"] = self.operator
+        if self.access_technology:
+            record["rat"] = self.access_technology
+        if self.searching_since is not None:
+            record["searching_seconds"] = round(self.clock() - self.searching_since, 1)
+        self.emit(json.dumps(record, separators=(',', ':')))
+        self.reset_window()
+
+
+class BluesPortReader(threading.Thread):
+    # One thread per notecard so a quiet card never holds up the other card's readline()
+    SPAN_NAMES = ('read', 'write', 'parse')
+
+    def __init__(self, name, port, logger, parser=None):
+        super().__init__(name=f"{name}_reader", daemon=True)
+        self.port = port
+        self.logger = logger
+        self.channel = IngestChannel(name, logger.info)
+        # Optional BluesTraceParser fed every raw line after it is logged
+        self.parser = parser
+        # LoopSpans attached by ProfilingControl while loop timing is switched on; read includes waiting for data
+        self.spans = None
+        self.write_lock = threading.Lock()
+        self.stop_event = threading.Event()
+
+    def write(self, data):
+        with self.write_lock:
+            self.port.write(data)
+
+    def run(self):
+        parser = self.parser
+        clock = time.perf_counter
+        while not self.stop_event.is_set():
+            spans = self.spans
+            if spans is not None:
+                started = clock()
+            line = self.port.readline()
+            if line:
+                self.channel.lines += 1
+                self.channel.bytes += len(line)
+                if spans is None:
+                    self.channel.emit(line)
+                    if parser is not None:
+                        parser.feed(line)
+                    continue
+
+                read_at = clock()
+                spans['read'].add(read_at - started)
+                self.channel.emit(line)
+                written = clock()
+                spans['write'].add(written - read_at)
+                if parser is not None:
+                    parser.feed(line)
+                    spans['parse'].add(clock() - written)
+            elif parser is not None:
+                # A quiet card still gets its summary on time; readline() returns empty after the port timeout
+                parser.maybe_summarize()
+
+    def stop(self):
+        self.stop_event.set()
+
+
+class BluesTraceTimer(threading.Thread):
+    # Re-sends card.trace on a fixed schedule anchored to the start time so the period does not drift
+    def __init__(self, readers, period_seconds, request=BLUES_TRACE_REQUEST):
+        super().__init__(name="blues_trace_timer", daemon=True)
+        self.readers = readers
+        self.period_seconds = period_seconds
+        self.request = request
+        self.stop_event = threading.Event()
+        self.wake_event = threading.Event()
+
+    def send(self):
+        for reader in self.readers:
+            reader.logger.info("Sending trace message again ----------------------------------------------------------")
+            reader.write(self.request)
+
+    def set_period(self, period_seconds):
+        # The new period counts from the last send
+        self.period_seconds = period_seconds
+        self.wake_event.set()
+
+    def run(self):
+        last_send = time.monotonic()
+        while not self.stop_event.is_set():
+            if self.wake_event.wait(max(0.0, last_send + self.period_seconds - time.monotonic())):
+                self.wake_event.clear()
+                continue
+            if self.stop_event.is_set():
+                break
+            self.send()
+            last_send += self.period_seconds
+            # After a long stall, skip the missed periods instead of sending a burst
+            while last_send + self.period_seconds <= time.monotonic():
+                last_send += self.period_seconds
+
+    def stop(self):
+        self.stop_event.set()
+        self.wake_event.set()
+
+
+def run_blues_readers(readers, timer):
+    for reader in readers:
+        reader.start()
+    timer.start()
+    try:
+        # A reader only exits on a port error; return so the service restarts instead of logging half the cards
+        while all(reader.is_alive() for reader in readers):
+            readers[0].join(1)
+    finally:
+        timer.stop()
+        for reader in readers:
+            reader.stop()
@@ -0,0 +1,99 @@
+import json
+import logging
+import mmap
+import os
+import struct
+import time
+
+CAPTURE_MAGIC = b"RNMCAP01"
+# Capture header after the magic: uint32 length of a JSON metadata block
+CAPTURE_HEADER = struct.Struct('<I')
+# Capture record: float64 unix timestamp of the read, uint32 chunk length, raw bytes as read from the port
+CAPTURE_RECORD = struct.Struct('<dI')
+
+
+class RawCaptureWriter:
+    def __init__(self, path, source, flush_interval=1.0):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(path, 'ab')
+        if self.file.tell() == 0:
+            metadata = json.dumps({"source": source, "created": time.time()}).encode('utf-8')
+            self.file.write(CAPTURE_MAGIC + CAPTURE_HEADER.pack(len(metadata)) + metadata)
+        self.flush_interval = flush_interval
+        self.next_flush = time.monotonic() + flush_interval
+        self.bytes = 0
+
+    def write(self, data):
+        self.file.write(CAPTURE_RECORD.pack(time.time(), len(data)))
+        self.file.write(data)
+        self.bytes += len(data)
+        self.flush_if_due()
+
+    def flush_if_due(self):
+        # Also called by the read loop while the port is quiet, so the last chunks before a pause reach the file
+        now = time.monotonic()
+        if now >= self.next_flush:
+            self.file.flush()
+            self.next_flush = now + self.flush_interval
+
+    def close(self):
+        self.file.close()
+
+
+def read_capture_metadata(view):
+    if view[:len(CAPTURE_MAGIC)] != CAPTURE_MAGIC:
+        raise ValueError("Not a raw serial capture file")
+    (length,) = CAPTURE_HEADER.unpack_from(view, len(CAPTURE_MAGIC))
+    start = len(CAPTURE_MAGIC) + CAPTURE_HEADER.size
+    return json.loads(bytes(view[start:start + length])), start + length
+
+
+def iter_capture(view, offset):
+    size = len(view)
+    while offset + CAPTURE_RECORD.size <= size:
+        timestamp, length = CAPTURE_RECORD.unpack_from(view, offset)
+        offset += CAPTURE_RECORD.size
+        if offset + length > size:
+            # Truncated by a power cut mid-write
+            break
+        yield timestamp, view[offset:offset + length]
+        offset += length
+
+
+class ReplayClock:
+    def __init__(self):
+        self.timestamp = time.time()
+
+
+def make_replay_emit(logger, clock):
+    # Logs with the capture timestamp rather than the time of the replay, so re-derived logs match the originals
+    def emit(text):
+        record = logger.makeRecord(logger.name, logging.INFO, "(replay)", 0, text, None, None)
+        record.created = clock.timestamp
+        record.msecs = (clock.timestamp - int(clock.timestamp)) * 1000
+        logger.handle(record)
+    return emit
+
+
+def replay_capture(path, ingest, clock, speed=None):
+    # speed None replays as fast as possible, otherwise 1.0 is real time, 10.0 ten times faster
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+        metadata, offset = read_capture_metadata(view)
+        chunks = 0
+        total_bytes = 0
+        replay_start = time.monotonic()
+        capture_start = None
+        for timestamp, chunk in iter_capture(view, offset):
+            if speed:
+                if capture_start is None:
+                    capture_start = timestamp
+                delay = (timestamp - capture_start) / speed - (time.monotonic() - replay_start)
+                if delay > 0:
+                    time.sleep(delay)
+            clock.timestamp = timestamp
+            ingest.feed(chunk)
+            chunks += 1
+            total_bytes += len(chunk)
+    return metadata, chunks, total_bytes
@@ -0,0 +1,100 @@
+import os
+import threading
+
+from lib.internal.service.fs_watch_service import DirectoryWatcher, IN_CLOSE_WRITE, IN_CREATE, IN_MOVED_TO
+
+SETTINGS_EVENTS = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+
+class SettingsFiles:
+    # The YAML files main_*.py build RemoteNodeMonitorConfig from: config/settings_config.yaml lists the settings_*
+    # files in the project root
+    def __init__(self, root):
+        self.root = root
+        self.directories = [root, os.path.join(root, 'config')]
+
+    def load(self):
+        from lib.external.pythontools.config import get_settings_dict_from_yaml
+        from lib.internal.model.remote_node_monitor import RemoteNodeMonitorConfig
+
+        return RemoteNodeMonitorConfig(
+            get_settings_dict_from_yaml(os.path.join(self.root, 'config', 'settings_config.yaml'), self.root))
+
+    @staticmethod
+    def is_settings_file(name):
+        return name.endswith(('.yaml', '.yml'))
+
+    def signature(self):
+        # Editors that save in place, by rename or twice in a row all end up here, reloads only happen on real changes
+        entries = []
+        for directory in self.directories:
+            try:
+                names = sorted(os.listdir(directory))
+            except FileNotFoundError:
+                continue
+            for name in names:
+                if self.is_settings_file(name):
+                    try:
+                        stat = os.stat(os.path.join(directory, name))
+                    except FileNotFoundError:
+                        continue
+                    entries.append((directory, name, stat.st_mtime_ns, stat.st_size))
+        return entries
+
+
+def settings_changed(settings, events):
+    # events from a DirectoryWatcher that also watches settings.directories; None means the watcher is polling
+    return events is None or any(directory in settings.directories and settings.is_settings_file(name)
+                                 for directory, name, _ in events)
+
+
+class ConfigReloader(threading.Thread):
+    # Rebuilds the configuration whenever a settings file changes and hands it to apply(config). A file that does not
+    # parse leaves the running configuration in place.
+    def __init__(self, settings, apply, logger, debounce=0.5, poll_interval=5.0):
+        super().__init__(name="config_reloader", daemon=True)
+        self.settings = settings
+        self.apply = apply
+        self.logger = logger
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.watcher = None
+        self.signature = settings.signature()
+        self.reloads = 0
+        self.stop_event = threading.Event()
+
+    def run(self):
+        # Loops that already wait on their own DirectoryWatcher call reload() themselves instead of starting the thread
+        self.watcher = DirectoryWatcher([d for d in self.settings.directories if os.path.isdir(d)], SETTINGS_EVENTS,
+                                        self.poll_interval)
+        while not self.stop_event.is_set():
+            events = self.watcher.wait(None)
+            if not settings_changed(self.settings, events):
+                continue
+            # Saving often takes several writes; let the burst settle before reading
+            while self.watcher.wait(self.debounce):
+                pass
+            self.reload()
+
+    def reload(self):
+        signature = self.settings.signature()
+        if signature == self.signature:
+            return 0
+        self.signature = signature
+        try:
+            config = self.settings.load()
+        except Exception as e:
+            self.logger.info(f"Settings changed but did not load, keeping the running configuration: {e}")
+            return 0
+        try:
+            self.apply(config)
+        except Exception as e:
+            self.logger.info(f"Applying changed settings failed: {e}")
+            return 0
+        self.reloads += 1
+        return 1
+
+    def stop(self):
+        self.stop_event.set()
+        if self.watcher is not None:
+            self.watcher.close()
@@ -0,0 +1,179 @@
+import datetime
+import hashlib
+import json
+import os
+import time
+
+from lib.internal.service.log_compression_service import PARTIAL_SUFFIX, needs_compression, split_compressed_suffix
+
+# A digit-named log untouched this long is no longer being written and can be compressed
+COMPRESS_QUIET_SECONDS = 300
+
+
+def is_rotated_log(file_name):
+    # TimedRotatingFileHandler output, e.g. skyla1.log.20221003 or skyla1.log.20221003.gz once compressed
+    return split_compressed_suffix(file_name)[0][-1:].isnumeric()
+
+
+def rename_rotated_logs(local_log_path, logger):
+    renamed = []
+    for file in os.listdir(local_log_path):
+        if is_rotated_log(file):
+            base, suffix = split_compressed_suffix(file)
+            new_filename = base[-8:] + "_" + base[:-9] + suffix
+            logger.info(f"Renaming {file} to {new_filename}")
+            os.rename(os.path.join(local_log_path, file), os.path.join(local_log_path, new_filename))
+            renamed.append(new_filename)
+    return renamed
+
+
+def file_digest(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class SyncManifest:
+    # On-disk index of files confirmed on the remote: name -> size, mtime_ns and sha256 at upload time
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.entries = json.load(f)
+
+    def copy(self):
+        # Detached copy to scan against without holding up the upload workers; never saved
+        copy = SyncManifest(None)
+        copy.entries = dict(self.entries)
+        return copy
+
+    def matches(self, name, stat):
+        entry = self.entries.get(name)
+        return entry is not None and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns
+
+    def confirm(self, name, stat, digest):
+        self.entries[name] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest}
+
+    def forget(self, name):
+        self.entries.pop(name, None)
+
+    def save(self):
+        temp_path = self.path + ".tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(self.entries, f, indent=1, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+
+
+def get_manifest_path(config):
+    return config.ManifestPath or os.path.join(config.LocalLogPath, ".sync_manifest.json")
+
+
+def find_pending_uploads(local_log_path, manifest, compression=None, uncompressible=()):
+    pending = []
+    for name in sorted(os.listdir(local_log_path)):
+        path = os.path.join(local_log_path, name)
+        if name.startswith(".") or name.endswith(PARTIAL_SUFFIX) or not os.path.isfile(path):
+            continue
+        if compression and needs_compression(name) and name not in uncompressible:
+            # Shipped once the compressor has replaced it with its compressed copy
+            continue
+        stat = os.stat(path)
+        if manifest.matches(name, stat):
+            continue
+        digest = file_digest(path)
+        entry = manifest.entries.get(name)
+        if entry is not None and entry["sha256"] == digest:
+            # Touched but not changed, nothing to ship
+            manifest.confirm(name, stat, digest)
+            continue
+        pending.append((name, stat, digest))
+    return pending
+
+
+def remove_uploaded_log(local_log_path, name, manifest):
+    # Only rotated files whose current contents are the ones confirmed remote are safe to delete
+    path = os.path.join(local_log_path, name)
+    if name[0].isnumeric() and os.path.isfile(path) and manifest.matches(name, os.stat(path)):
+        os.remove(path)
+        manifest.forget(name)
+        return True
+    return False
+
+
+def remove_uploaded_logs(local_log_path, manifest):
+    for name in os.listdir(local_log_path):
+        remove_uploaded_log(local_log_path, name, manifest)
+
+
+def queue_uncompressed_logs(local_log_path, compressor, quiet_seconds=COMPRESS_QUIET_SECONDS):
+    # Catches what the rename path never hands the compressor, e.g. {run}_molly.log. Files written to recently may
+    # still be open in a logger, and compressing removes the original.
+    now = time.time()
+    for name in os.listdir(local_log_path):
+        if needs_compression(name):
+            try:
+                modified = os.stat(os.path.join(local_log_path, name)).st_mtime
+            except FileNotFoundError:
+                continue
+            if now - modified >= quiet_seconds:
+                compressor.submit(name)
+
+
+def sync_logs(config, scheduler, compressor=None):
+    # Queues whatever changed since it was last uploaded; the UploadScheduler's workers do the uploading
+    uncompressible = ()
+    if config.Compression and compressor is not None:
+        queue_uncompressed_logs(config.LocalLogPath, compressor)
+        uncompressible = set(compressor.failed)
+    # Hashing the changed files, the growing live logs among them, happens outside the scheduler's lock
+    with scheduler.condition:
+        snapshot = scheduler.manifest.copy()
+    scanned = dict(snapshot.entries)
+    pending = find_pending_uploads(config.LocalLogPath, snapshot, config.Compression, uncompressible)
+
+    manifest = scheduler.manifest
+    with scheduler.condition:
+        for name, entry in snapshot.entries.items():
+            # Touched but unchanged files, unless a worker recorded an upload of them meanwhile
+            if entry is not scanned.get(name) and manifest.entries.get(name) is scanned.get(name):
+                manifest.entries[name] = entry
+        pending = [(name, stat, digest) for name, stat, digest in pending if not manifest.matches(name, stat)]
+        remove_uploaded_logs(config.LocalLogPath, manifest)
+        manifest.save()
+        scheduler.submit(pending)
+    return len(pending)
+
+
+class DriveSyncSchedule:
+    # Mode 1 syncs every SyncFrequency seconds, mode 2 once a day during the ResetDailyTime hour
+    def __init__(self, config):
+        self.config = config
+        self.last_sync = time.monotonic()
+        self.last_date_synced = None
+
+    def seconds_until_due(self):
+        if self.config.Mode == 1:
+            return max(0.0, self.last_sync + self.config.SyncFrequency - time.monotonic())
+
+        now = datetime.datetime.now()
+        sync_hour = now.replace(hour=self.config.ResetDailyTime, minute=0, second=0, microsecond=0)
+        if self.last_date_synced == now.date() or now >= sync_hour + datetime.timedelta(hours=1):
+            sync_hour += datetime.timedelta(days=1)
+        # Re-check at least every 5 minutes, the Pi has no RTC and its wall clock can jump once NTP syncs
+        return min(max(0.0, (sync_hour - now).total_seconds()), 300.0)
+
+    def due(self):
+        if self.config.Mode == 1:
+            return time.monotonic() - self.last_sync >= self.config.SyncFrequency
+
+        now = datetime.datetime.now()
+        return self.last_date_synced != now.date() and now.hour == self.config.ResetDailyTime
+
+    def mark_synced(self):
+        self.last_sync = time.monotonic()
+        self.last_date_synced = datetime.date.today()
@@ -0,0 +1,192 @@
+import datetime
+import hashlib
+import json
+import os
+import time
+
+# Intel HEX record types
+HEX_DATA = 0x00
+HEX_EOF = 0x01
+HEX_EXTENDED_SEGMENT_ADDRESS = 0x02
+HEX_START_SEGMENT_ADDRESS = 0x03
+HEX_EXTENDED_LINEAR_ADDRESS = 0x04
+HEX_START_LINEAR_ADDRESS = 0x05
+
+
+class HexImage:
+    # A validated Intel HEX file reduced to the bytes it programs. The digest covers addresses and data only, so the
+    # same image re-exported with different line lengths or record order still matches.
+    def __init__(self, path, segments):
+        self.path = path
+        self.segments = segments
+        self.size = sum(len(data) for _, data in segments)
+        self.start = segments[0][0] if segments else 0
+        self.end = segments[-1][0] + len(segments[-1][1]) if segments else 0
+        digest = hashlib.sha256()
+        for address, data in segments:
+            digest.update(address.to_bytes(4, 'little') + len(data).to_bytes(4, 'little'))
+            digest.update(data)
+        self.digest = digest.hexdigest()
+
+
+def parse_intel_hex(path):
+    memory = {}
+    base = 0
+    eof = False
+    with open(path, 'r', encoding='ascii', errors='replace') as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            if eof:
+                raise ValueError(f"{path}:{number}: data after end of file record")
+            if line[0] != ':' or len(line) < 11 or len(line) % 2 == 0:
+                raise ValueError(f"{path}:{number}: not an Intel HEX record")
+            try:
+                record = bytes.fromhex(line[1:])
+            except ValueError:
+                raise ValueError(f"{path}:{number}: invalid hex digits") from None
+            length = record[0]
+            if len(record) != length + 5:
+                raise ValueError(f"{path}:{number}: byte count {length} does not match record length")
+            if sum(record) & 0xFF:
+                raise ValueError(f"{path}:{number}: checksum mismatch")
+
+            address = (record[1] << 8) | record[2]
+            kind = record[3]
+            data = record[4:-1]
+            if kind == HEX_DATA:
+                for offset, value in enumerate(data):
+                    memory[base + address + offset] = value
+            elif kind == HEX_EOF:
+                eof = True
+            elif kind == HEX_EXTENDED_SEGMENT_ADDRESS and length == 2:
+                base = int.from_bytes(data, 'big') << 4
+            elif kind == HEX_EXTENDED_LINEAR_ADDRESS and length == 2:
+                base = int.from_bytes(data, 'big') << 16
+            elif kind in (HEX_START_SEGMENT_ADDRESS, HEX_START_LINEAR_ADDRESS) and length == 4:
+                pass
+            else:
+                raise ValueError(f"{path}:{number}: unsupported record type {kind:02X} of length {length}")
+    if not eof:
+        raise ValueError(f"{path}: missing end of file record, the file is truncated")
+    if not memory:
+        raise ValueError(f"{path}: no data records")
+
+    # Coalesce into contiguous (address, bytes) runs
+    segments = []
+    run_start = None
+    run = bytearray()
+    for address in sorted(memory):
+        if run_start is not None and address != run_start + len(run):
+            segments.append((run_start, bytes(run)))
+            run_start = None
+            run = bytearray()
+        if run_start is None:
+            run_start = address
+        run.append(memory[address])
+    segments.append((run_start, bytes(run)))
+    return HexImage(path, segments)
+
+
+def load_hex_images(paths):
+    # Each distinct file is parsed once, however many boards share it; a bad file maps to its ValueError
+    images = {}
+    for path in paths:
+        if path not in images:
+            try:
+                images[path] = parse_intel_hex(path)
+            except (OSError, ValueError) as e:
+                images[path] = e
+    return images
+
+
+class FlashCache:
+    # Board -> digest of the image last verified on it. An entry is dropped before every flash attempt, so a board
+    # left half-written by a failed flash is never skipped.
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.entries = json.load(f)
+
+    def matches(self, board, image):
+        entry = self.entries.get(board)
+        return entry is not None and entry["sha256"] == image.digest
+
+    def confirm(self, board, image):
+        self.entries[board] = {
+            "sha256": image.digest,
+            "hex_path": image.path,
+            "verified": datetime.datetime.now().isoformat(timespec='seconds'),
+        }
+        self.save()
+
+    def forget(self, board):
+        if self.entries.pop(board, None) is not None:
+            self.save()
+
+    def save(self):
+        if not self.path:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(self.entries, f, indent=1, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+
+
+class ProgrammingResult:
+    def __init__(self, board, hex_path, digest=None):
+        self.board = board
+        self.hex_path = hex_path
+        self.digest = digest
+        self.status = "pending"     # skipped, verified, failed or invalid
+        self.attempts = 0
+        self.attempt_seconds = []
+        self.started = time.monotonic()
+        self.seconds = 0.0
+        self.error = None
+
+    def finish(self, status, error=None):
+        self.status = status
+        self.error = error
+        self.seconds = time.monotonic() - self.started
+
+    def to_dict(self):
+        return {
+            "board": self.board,
+            "hex_path": self.hex_path,
+            "sha256": self.digest,
+            "status": self.status,
+            "attempts": self.attempts,
+            "attempt_seconds": [round(seconds, 3) for seconds in self.attempt_seconds],
+            "seconds": round(self.seconds, 3),
+            "error": self.error,
+        }
+
+
+def append_programming_results(path, run, results):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    timestamp = datetime.datetime.now().isoformat(timespec='seconds')
+    with open(path, 'a') as f:
+        for result in results:
+            f.write(json.dumps(dict(result.to_dict(), run=run, time=timestamp), sort_keys=True) + "\n")
+
+
+def format_programming_summary(results):
+    lines = [f"{'BOARD':<10}{'STATUS':<10}{'ATTEMPTS':<10}{'SECONDS':<10}IMAGE"]
+    for result in results:
+        image = os.path.basename(result.hex_path or "")
+        if result.error:
+            image += f" ({result.error})"
+        lines.append(f"{result.board:<10}{result.status:<10}{result.attempts:<10}{result.seconds:<10.1f}{image}")
+    lines.append(f"Total {sum(result.seconds for result in results):.1f}s")
+    return "\n".join(lines)
@@ -0,0 +1,127 @@
+import logging
+from logging.handlers import TimedRotatingFileHandler
+import os
+import threading
+import time
+
+
+class GroupCommitMixin:
+    # Collects formatted records in memory and writes them to the card in whole pages, aligned to the file offset.
+    # A partial page is written once its oldest record is max_latency seconds old and written data is fsynced every
+    # fsync_interval seconds, so a power cut loses at most about max_latency + fsync_interval seconds of lines.
+    def __init__(self, *args, page_size=4096, max_latency=2.0, fsync_interval=10.0, **kwargs):
+        self.page_size = page_size
+        self.max_latency = max_latency
+        self.fsync_interval = fsync_interval
+        self.buffer = bytearray()
+        self.oldest = None
+        self.offset = 0
+        self.unsynced = 0
+        self.last_fsync = time.monotonic()
+
+        self.writes = 0
+        self.bytes_written = 0
+        self.fsyncs = 0
+        self.max_buffered = 0
+
+        super().__init__(*args, **kwargs)
+        self.offset = os.fstat(self.stream.fileno()).st_size
+
+        self.stop_event = threading.Event()
+        self.flusher = threading.Thread(target=self.run_flusher, name=f"{self.baseFilename}_commit", daemon=True)
+        self.flusher.start()
+
+    def _open(self):
+        return open(self.baseFilename, 'ab', buffering=0)
+
+    def emit(self, record):
+        try:
+            if hasattr(self, 'shouldRollover') and self.shouldRollover(record):
+                self.commit(sync=True)
+                self.doRollover()
+                self.offset = os.fstat(self.stream.fileno()).st_size
+
+            if not self.buffer:
+                self.oldest = time.monotonic()
+            self.buffer += (self.format(record) + self.terminator).encode('utf-8', 'replace')
+            self.max_buffered = max(self.max_buffered, len(self.buffer))
+
+            aligned = (self.offset + len(self.buffer)) // self.page_size * self.page_size - self.offset
+            if aligned > 0:
+                self.write(aligned)
+        except Exception:
+            self.handleError(record)
+
+    def write(self, count):
+        view = memoryview(self.buffer)
+        try:
+            written = 0
+            while written < count:
+                written += self.stream.write(view[written:count])
+        finally:
+            view.release()
+        del self.buffer[:count]
+        self.offset += count
+        self.unsynced += count
+        self.writes += 1
+        self.bytes_written += count
+        self.oldest = time.monotonic() if self.buffer else None
+
+    def commit(self, sync=False):
+        if self.stream is None:
+            return
+        if self.buffer:
+            self.write(len(self.buffer))
+        if self.unsynced and (sync or time.monotonic() - self.last_fsync >= self.fsync_interval):
+            os.fsync(self.stream.fileno())
+            self.unsynced = 0
+            self.fsyncs += 1
+            self.last_fsync = time.monotonic()
+
+    def run_flusher(self):
+        tick = min(self.max_latency, self.fsync_interval) / 2
+        while not self.stop_event.wait(tick):
+            self.acquire()
+            try:
+                if self.oldest is not None and time.monotonic() - self.oldest >= self.max_latency:
+                    self.write(len(self.buffer))
+                if self.unsynced and time.monotonic() - self.last_fsync >= self.fsync_interval:
+                    self.commit()
+            except Exception:
+                pass
+            finally:
+                self.release()
+
+    def stats(self):
+        return {
+            "writes": self.writes,
+            "bytes_written": self.bytes_written,
+            "bytes_per_write": self.bytes_written / self.writes if self.writes else 0,
+            "fsyncs": self.fsyncs,
+            "buffered": len(self.buffer),
+            "max_buffered": self.max_buffered,
+        }
+
+    def flush(self):
+        self.acquire()
+        try:
+            self.commit(sync=True)
+        finally:
+            self.release()
+
+    def flush_batch(self):
+        # Behind a BatchLogWriter the commit timer, not the batch, decides when bytes reach the card
+        pass
+
+    def close(self):
+        self.stop_event.set()
+        self.flush()
+        super().close()
+
+
+class GroupCommitFileHandler(GroupCommitMixin, logging.FileHandler):
+    pass
+
+
+class GroupCommitTimedRotatingFileHandler(GroupCommitMixin, TimedRotatingFileHandler):
+    pass
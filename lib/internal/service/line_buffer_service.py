@@ -0,0 +1,179 @@
+import datetime
+import os
+import select
+import socket
+import socketserver
+import threading
+import time
+
+DEFAULT_LINE_BUFFER_SOCKET = "/tmp/remote_node_monitor.sock"
+
+
+class LineRing:
+    # The last capacity lines of one channel in preallocated slots. The read loop is the only writer and never waits
+    # on readers; readers copy a range and drop whatever the writer lapped while they were copying.
+    def __init__(self, capacity=1000):
+        self.capacity = capacity
+        self.times = [0.0] * capacity
+        self.lines = [None] * capacity
+        self.seq = 0
+
+    def append(self, text):
+        index = self.seq % self.capacity
+        self.times[index] = time.time()
+        self.lines[index] = text
+        self.seq += 1
+
+    def read(self, since=None, limit=None):
+        # Returns (first sequence number returned, next sequence number, [(timestamp, text), ...])
+        end = self.seq
+        start = max(end - self.capacity, since or 0)
+        if limit is not None:
+            start = max(start, end - limit)
+        capacity = self.capacity
+        entries = [(self.times[i % capacity], self.lines[i % capacity]) for i in range(start, end)]
+        lapped = self.seq - capacity
+        if lapped > start:
+            entries = entries[lapped - start:]
+            start = lapped
+        return start, end, entries
+
+
+def make_ring_emit(emit, ring):
+    append = ring.append
+
+    def ring_emit(text):
+        append(text)
+        emit(text)
+    return ring_emit
+
+
+def format_entry(channel, timestamp, text):
+    when = datetime.datetime.fromtimestamp(timestamp).isoformat(sep=' ', timespec='milliseconds')
+    return f"{when} {channel} {text}\n"
+
+
+class LineBufferHandler(socketserver.StreamRequestHandler):
+    # One request line per connection:
+    #   channels                      channel names and line counts
+    #   tail <channel> [n]            last n lines (default 50)
+    #   snapshot [n]                  last n lines (default all buffered) of every channel, merged by time
+    #   follow <channel|*> [n]        last n lines (default 10), then new lines until the client disconnects
+    # plus whatever commands the server was given, e.g. release/resume <source> for handing a port to Molly
+    def handle(self):
+        self.request.settimeout(5)
+        try:
+            words = self.rfile.readline(1024).decode('utf-8', 'replace').split()
+        except socket.timeout:
+            return
+        self.request.settimeout(None)
+        rings = self.server.rings
+        try:
+            command = words[0] if words else ""
+            if command == "channels":
+                self.send("".join(f"{name} {ring.seq}\n" for name, ring in rings.items()))
+            elif command == "tail" and len(words) > 1 and words[1] in rings:
+                _, _, entries = rings[words[1]].read(limit=self.count(words, 2, 50))
+                self.send("".join(format_entry(words[1], t, text) for t, text in entries))
+            elif command == "snapshot":
+                limit = self.count(words, 1, None)
+                merged = []
+                for name, ring in rings.items():
+                    merged.extend((t, name, text) for t, text in ring.read(limit=limit)[2])
+                merged.sort(key=lambda entry: entry[0])
+                self.send("".join(format_entry(name, t, text) for t, name, text in merged))
+            elif command == "follow" and len(words) > 1 and (words[1] == "*" or words[1] in rings):
+                self.follow(words[1], self.count(words, 2, 10))
+            elif command in self.server.commands:
+                self.send(self.server.commands[command](words[1:]) + "\n")
+            else:
+                self.send(f"unknown request, channels: {' '.join(rings)}\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    @staticmethod
+    def count(words, index, default):
+        try:
+            return max(0, int(words[index])) if len(words) > index else default
+        except ValueError:
+            return default
+
+    def send(self, text):
+        self.wfile.write(text.encode('utf-8'))
+        self.wfile.flush()
+
+    def follow(self, channel, backlog):
+        rings = self.server.rings
+        names = list(rings) if channel == "*" else [channel]
+        positions = {name: max(rings[name].seq - backlog, 0) for name in names}
+        while not self.server.stopped:
+            out = []
+            for name in names:
+                start, end, entries = rings[name].read(positions[name])
+                if start > positions[name]:
+                    out.append(f"... {name}: {start - positions[name]} lines dropped, follower too slow\n")
+                out.extend(format_entry(name, t, text) for t, text in entries)
+                positions[name] = end
+            if out:
+                self.send("".join(out))
+            # Doubles as the poll interval and as the check for a client that went away while its channel was quiet
+            readable, _, _ = select.select([self.request], [], [], self.server.follow_interval)
+            if readable and not self.request.recv(1024):
+                return
+
+
+class LineBufferServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, rings, follow_interval=0.1, commands=None):
+        if os.path.exists(path):
+            # Left behind by a previous run that was killed
+            os.remove(path)
+        # Replaced as a whole when the channels change, handlers pick up the new dict on their next request
+        self.rings = rings
+        # name -> function taking the request's arguments and returning a one-line reply
+        self.commands = commands or {}
+        self.follow_interval = follow_interval
+        self.stopped = False
+        super().__init__(path, LineBufferHandler)
+
+    def stop(self):
+        self.stopped = True
+        self.shutdown()
+
+
+def start_line_buffer_server(rings, path, follow_interval=0.1, commands=None):
+    server = LineBufferServer(path, rings, follow_interval, commands)
+    threading.Thread(target=server.serve_forever, name="line_buffer_server", daemon=True).start()
+    return server
+
+
+def request_line_buffer(path, request, output):
+    # Client side for main_tail.py: sends one request and copies the reply to output until the server closes
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(path)
+        client.sendall(request.encode('utf-8') + b"\n")
+        while 1:
+            data = client.recv(65536)
+            if not data:
+                break
+            output.write(data.decode('utf-8', 'replace'))
+            output.flush()
+
+
+def send_monitor_command(path, request, timeout=30.0):
+    # Returns the monitor's one-line reply, or None when no monitor is listening on path
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.settimeout(timeout)
+            client.connect(path)
+            client.sendall(request.encode('utf-8') + b"\n")
+            reply = b""
+            while not reply.endswith(b"\n"):
+                data = client.recv(1024)
+                if not data:
+                    break
+                reply += data
+    except (FileNotFoundError, ConnectionRefusedError):
+        return None
+    return reply.decode('utf-8', 'replace').strip()
@@ -0,0 +1,107 @@
+import os
+import queue
+import threading
+import time
+
+COMPRESSED_SUFFIXES = {
+    "gzip": ".gz",
+    "zstd": ".zst",
+}
+PARTIAL_SUFFIX = ".part"
+
+
+def split_compressed_suffix(file_name):
+    for suffix in COMPRESSED_SUFFIXES.values():
+        if file_name.endswith(suffix):
+            return file_name[:-len(suffix)], suffix
+    return file_name, ""
+
+
+def needs_compression(file_name):
+    # Renamed rotated segments, e.g. 20221003_skyla1.log
+    return (file_name[:1].isnumeric() and not file_name.endswith(PARTIAL_SUFFIX)
+            and not split_compressed_suffix(file_name)[1])
+
+
+def open_compressed_writer(codec, path):
+    if codec == "gzip":
+        import gzip
+        return gzip.open(path, 'wb', compresslevel=6)
+    if codec == "zstd":
+        import zstandard
+        return zstandard.ZstdCompressor(level=3).stream_writer(open(path, 'wb'), closefd=True)
+    raise ValueError(f"Unknown log compression codec: {codec}")
+
+
+def compress_file(path, codec, cpu_budget=0.25, chunk_size=256 * 1024):
+    # cpu_budget is the fraction of one core this thread may use: after each chunk it sleeps in proportion to the CPU
+    # time the chunk took
+    compressed_path = path + COMPRESSED_SUFFIXES[codec]
+    partial_path = compressed_path + PARTIAL_SUFFIX
+    stat = os.stat(path)
+    with open(path, 'rb') as source, open_compressed_writer(codec, partial_path) as target:
+        while 1:
+            started = time.thread_time()
+            chunk = source.read(chunk_size)
+            if not chunk:
+                break
+            target.write(chunk)
+            if cpu_budget < 1:
+                time.sleep((time.thread_time() - started) * (1 - cpu_budget) / cpu_budget)
+    os.utime(partial_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    os.replace(partial_path, compressed_path)
+    os.remove(path)
+    return compressed_path
+
+
+class LogCompressor(threading.Thread):
+    def __init__(self, local_log_path, codec, logger, cpu_budget=0.25):
+        super().__init__(name="log_compressor", daemon=True)
+        if codec not in COMPRESSED_SUFFIXES:
+            raise ValueError(f"Unknown log compression codec: {codec}")
+        self.local_log_path = local_log_path
+        self.codec = codec
+        self.logger = logger
+        self.cpu_budget = cpu_budget
+        self.queue = queue.Queue()
+        # Names waiting or being compressed, so repeated sweeps do not queue a file twice
+        self.queued = set()
+        # Names whose compression failed; uploaded as they are instead
+        self.failed = set()
+
+    def submit(self, file_name):
+        if file_name in self.queued or file_name in self.failed:
+            return
+        self.queued.add(file_name)
+        self.queue.put(file_name)
+
+    def submit_pending(self):
+        for file_name in sorted(os.listdir(self.local_log_path)):
+            if file_name.endswith(PARTIAL_SUFFIX):
+                # Left behind by an interrupted run, the source segment is still there
+                os.remove(os.path.join(self.local_log_path, file_name))
+            elif needs_compression(file_name):
+                self.submit(file_name)
+
+    def run(self):
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+        except (AttributeError, OSError):
+            pass
+
+        while 1:
+            file_name = self.queue.get()
+            path = os.path.join(self.local_log_path, file_name)
+            if not os.path.exists(path):
+                self.queued.discard(file_name)
+                continue
+            try:
+                started = time.monotonic()
+                original_size = os.path.getsize(path)
+                compressed_path = compress_file(path, self.codec, self.cpu_budget)
+                self.logger.info(f"Compressed {file_name}: {original_size} -> {os.path.getsize(compressed_path)} "
+                                 f"bytes in {time.monotonic() - started:.1f}s")
+            except Exception as e:
+                self.logger.info(f"Compressing {file_name} failed, uploading it uncompressed: {e}")
+                self.failed.add(file_name)
+            self.queued.discard(file_name)
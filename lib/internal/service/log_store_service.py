@@ -0,0 +1,152 @@
+import bisect
+import logging
+import mmap
+import os
+import struct
+
+from lib.internal.service.log_writer_service import BatchFlushMixin
+
+# Segment record: float64 unix timestamp, uint32 length, utf-8 message
+RECORD_HEADER = struct.Struct('<dI')
+# Sparse index entry: float64 timestamp of the first record at or after offset, uint64 offset into the segment
+INDEX_ENTRY = struct.Struct('<dQ')
+
+SEGMENT_SUFFIX = ".seg"
+INDEX_SUFFIX = ".idx"
+
+
+class LogStoreWriter:
+    def __init__(self, root, board, segment_bytes=16 * 1024 * 1024, index_interval=64 * 1024):
+        self.directory = os.path.join(root, board)
+        self.segment_bytes = segment_bytes
+        self.index_interval = index_interval
+        os.makedirs(self.directory, exist_ok=True)
+
+        self.segment = None
+        self.index = None
+        self.size = 0
+        self.next_index_at = 0
+
+    def open_segment(self, timestamp):
+        self.close()
+        base = os.path.join(self.directory, f"{int(timestamp * 1000):013d}")
+        self.segment = open(base + SEGMENT_SUFFIX, 'ab')
+        self.index = open(base + INDEX_SUFFIX, 'ab')
+        self.size = self.segment.tell()
+        self.next_index_at = self.size
+
+    def append(self, timestamp, text):
+        if self.segment is None or self.size >= self.segment_bytes:
+            self.open_segment(timestamp)
+
+        if self.size >= self.next_index_at:
+            self.index.write(INDEX_ENTRY.pack(timestamp, self.size))
+            self.next_index_at = self.size + self.index_interval
+
+        data = text.encode('utf-8', 'replace')
+        self.segment.write(RECORD_HEADER.pack(timestamp, len(data)))
+        self.segment.write(data)
+        self.size += RECORD_HEADER.size + len(data)
+
+    def flush(self):
+        if self.segment is not None:
+            self.segment.flush()
+            self.index.flush()
+
+    def close(self):
+        if self.segment is not None:
+            self.segment.close()
+            self.index.close()
+            self.segment = None
+            self.index = None
+
+
+class LogStoreHandler(logging.Handler):
+    def __init__(self, root, board, segment_bytes=16 * 1024 * 1024, index_interval=64 * 1024):
+        super().__init__()
+        self.writer = LogStoreWriter(root, board, segment_bytes, index_interval)
+
+    def emit(self, record):
+        try:
+            self.writer.append(record.created, record.getMessage())
+            self.flush()
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        self.acquire()
+        try:
+            self.writer.flush()
+        finally:
+            self.release()
+
+    def close(self):
+        self.acquire()
+        try:
+            self.writer.close()
+        finally:
+            self.release()
+        super().close()
+
+
+class BatchLogStoreHandler(BatchFlushMixin, LogStoreHandler):
+    pass
+
+
+def list_segments(root, board):
+    directory = os.path.join(root, board)
+    if not os.path.isdir(directory):
+        return []
+    names = sorted(name[:-len(SEGMENT_SUFFIX)] for name in os.listdir(directory) if name.endswith(SEGMENT_SUFFIX))
+    return [(int(name) / 1000, os.path.join(directory, name)) for name in names]
+
+
+def read_index(base):
+    try:
+        with open(base + INDEX_SUFFIX, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return [], []
+    # Ignore a trailing partial entry from a writer that is mid-append
+    data = data[:len(data) - len(data) % INDEX_ENTRY.size]
+    timestamps = []
+    offsets = []
+    for timestamp, offset in INDEX_ENTRY.iter_unpack(data):
+        timestamps.append(timestamp)
+        offsets.append(offset)
+    return timestamps, offsets
+
+
+def scan_segment(base, start, end, needle=None):
+    timestamps, offsets = read_index(base)
+    position = bisect.bisect_right(timestamps, start) - 1
+    offset = offsets[position] if position >= 0 else 0
+
+    with open(base + SEGMENT_SUFFIX, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size <= offset:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            while offset + RECORD_HEADER.size <= size:
+                timestamp, length = RECORD_HEADER.unpack_from(view, offset)
+                body_start = offset + RECORD_HEADER.size
+                offset = body_start + length
+                if offset > size:
+                    break
+                if timestamp > end:
+                    break
+                if timestamp < start:
+                    continue
+                if needle is not None and view.find(needle, body_start, offset) < 0:
+                    continue
+                yield timestamp, view[body_start:offset].decode('utf-8', 'replace')
+
+
+def query_log_store(root, board, start, end, contains=None):
+    needle = contains.encode('utf-8') if contains else None
+    segments = list_segments(root, board)
+    for i, (segment_start, base) in enumerate(segments):
+        segment_end = segments[i + 1][0] if i + 1 < len(segments) else float('inf')
+        if segment_start > end or segment_end < start:
+            continue
+        yield from scan_segment(base, start, end, needle)
@@ -0,0 +1,142 @@
+import atexit
+import logging
+from logging.handlers import QueueHandler, TimedRotatingFileHandler
+import queue
+import threading
+import time
+
+
+class BatchFlushMixin:
+    # Handlers behind a BatchLogWriter skip the per-record flush in StreamHandler.emit; the writer flushes per batch
+    def flush(self):
+        pass
+
+    def flush_batch(self):
+        super().flush()
+
+
+class BatchStreamHandler(BatchFlushMixin, logging.StreamHandler):
+    pass
+
+
+class BatchFileHandler(BatchFlushMixin, logging.FileHandler):
+    pass
+
+
+class BatchTimedRotatingFileHandler(BatchFlushMixin, TimedRotatingFileHandler):
+    pass
+
+
+class DroppingQueueHandler(QueueHandler):
+    def __init__(self, writer):
+        super().__init__(writer.queue)
+        self.writer = writer
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.writer.dropped += 1
+
+
+class BatchLogWriter(threading.Thread):
+    def __init__(self, name, handlers, queue_size=10000, batch_size=256, flush_interval=1.0):
+        super().__init__(name=f"{name}_log_writer", daemon=True)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self.written = 0
+        self.flushes = 0
+        self.dropped = 0
+        self.max_queue_depth = 0
+        self._dropped_reported = 0
+        self._stopping = False
+
+    def stats(self):
+        return {
+            "queue_depth": self.queue.qsize(),
+            "queue_size": self.queue.maxsize,
+            "max_queue_depth": self.max_queue_depth,
+            "written": self.written,
+            "flushes": self.flushes,
+            "dropped": self.dropped,
+        }
+
+    def run(self):
+        pending = 0
+        last_flush = time.monotonic()
+        while 1:
+            timeout = max(0.0, last_flush + self.flush_interval - time.monotonic())
+            try:
+                record = self.queue.get(timeout=timeout if pending else None)
+            except queue.Empty:
+                record = None
+
+            if record is not None:
+                self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize() + 1)
+                self.handle(record)
+                pending += 1
+                # Drain what is already queued without waking up per record
+                while pending < self.batch_size:
+                    try:
+                        record = self.queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    self.handle(record)
+                    pending += 1
+
+            if pending >= self.batch_size or time.monotonic() - last_flush >= self.flush_interval:
+                self.report_drops()
+                self.flush()
+                pending = 0
+                last_flush = time.monotonic()
+
+            if self._stopping and self.queue.empty():
+                self.flush()
+                return
+
+    def handle(self, record):
+        if record is _STOP:
+            self._stopping = True
+            return
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+        self.written += 1
+
+    def flush(self):
+        for handler in self.handlers:
+            handler.flush_batch()
+        self.flushes += 1
+
+    def report_drops(self):
+        if self.dropped == self._dropped_reported:
+            return
+        record = logging.makeLogRecord({
+            "name": self.name,
+            "levelno": logging.WARNING,
+            "levelname": "WARNING",
+            "msg": f"Log queue full: dropped {self.dropped - self._dropped_reported} records "
+                   f"({self.dropped} total, queue depth {self.queue.qsize()}/{self.queue.maxsize})",
+        })
+        self._dropped_reported = self.dropped
+        self.handle(record)
+
+    def stop(self, timeout=5):
+        if not self.is_alive():
+            return
+        # Blocking put so the stop marker is never the record that gets dropped
+        self.queue.put(_STOP)
+        self.join(timeout)
+
+
+_STOP = logging.makeLogRecord({"msg": "stop"})
+
+
+def start_log_writer(name, handlers, queue_size=10000, batch_size=256, flush_interval=1.0):
+    writer = BatchLogWriter(name, handlers, queue_size, batch_size, flush_interval)
+    writer.start()
+    atexit.register(writer.stop)
+    return DroppingQueueHandler(writer)
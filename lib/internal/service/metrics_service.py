@@ -0,0 +1,180 @@
+import bisect
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import time
+
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+
+class MetricsRegistry:
+    # Objects on the hot path only increment their own counters; everything else happens when sampled or rendered
+    def __init__(self, prefix="rnm"):
+        self.prefix = prefix
+        self.started = time.monotonic()
+        self.sources = {}
+        self.channels = {}
+        self.log_writers = {}
+        self.last_seen = {}
+        self.lock = threading.Lock()
+
+    def register_source(self, name, source):
+        # Anything with lines, bytes, unrouted and decode_errors counters and an optional chunk_latency histogram
+        if getattr(source, 'chunk_latency', False) is None:
+            source.chunk_latency = Histogram()
+        self.sources[name] = source
+
+    def register_channel(self, source, channel):
+        # Anything with name, lines, bytes and decode_errors counters. Channels come and go on a settings reload
+        # while the reporter and the HTTP server read them, so both dicts only change under the lock.
+        with self.lock:
+            self.channels[(source, channel.name)] = channel
+            self.last_seen[(source, channel.name)] = [0, None]
+
+    def unregister_channel(self, source, name):
+        with self.lock:
+            self.channels.pop((source, name), None)
+            self.last_seen.pop((source, name), None)
+
+    def register_log_writer(self, name, writer):
+        # Anything with a stats() dict, e.g. BatchLogWriter or a group commit handler
+        self.log_writers[name] = writer
+
+    def sample(self):
+        # Time since last line, resolved to the sampling period so the read loop never calls the clock per line
+        now = time.monotonic()
+        with self.lock:
+            for key, channel in self.channels.items():
+                seen = self.last_seen[key]
+                if channel.lines != seen[0]:
+                    seen[0] = channel.lines
+                    seen[1] = now
+
+    def channel_snapshot(self):
+        # [(key, channel, time of the last line seen or None)]
+        with self.lock:
+            return [(key, channel, self.last_seen[key][1]) for key, channel in self.channels.items()]
+
+    def seconds_since(self, seen):
+        return time.monotonic() - (seen if seen is not None else self.started)
+
+    def render(self):
+        p = self.prefix
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {p}_{name} {help_text}")
+            lines.append(f"# TYPE {p}_{name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{p}_{name}{labels} {value}")
+
+        channels = self.channel_snapshot()
+        metric("channel_lines_total", "counter", "Lines routed to the channel.",
+               [(_labels(source=s, channel=c), ch.lines) for (s, c), ch, _ in channels])
+        metric("channel_bytes_total", "counter", "Bytes routed to the channel.",
+               [(_labels(source=s, channel=c), ch.bytes) for (s, c), ch, _ in channels])
+        metric("channel_decode_errors_total", "counter",
+               "Lines with invalid UTF-8, logged with replacement characters.",
+               [(_labels(source=s, channel=c), ch.decode_errors) for (s, c), ch, _ in channels])
+        metric("channel_seconds_since_last_line", "gauge", "Seconds since the channel last received a line.",
+               [(_labels(source=s, channel=c), round(self.seconds_since(seen), 3)) for (s, c), _, seen in channels])
+
+        sources = list(self.sources.items())
+        metric("source_bytes_total", "counter", "Bytes read from the source port.",
+               [(_labels(source=s), src.bytes) for s, src in sources])
+        metric("source_lines_total", "counter", "Lines read from the source port.",
+               [(_labels(source=s), src.lines) for s, src in sources])
+        metric("source_unrouted_total", "counter", "Lines with no matching channel prefix.",
+               [(_labels(source=s), src.unrouted) for s, src in sources])
+
+        lines.append(f"# HELP {p}_source_chunk_seconds Time to split and route one read from the source port.")
+        lines.append(f"# TYPE {p}_source_chunk_seconds histogram")
+        for s, src in sources:
+            histogram = getattr(src, 'chunk_latency', None)
+            if histogram is None:
+                continue
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + (float('inf'),), histogram.counts):
+                cumulative += count
+                le = "+Inf" if bound == float('inf') else bound
+                lines.append(f'{p}_source_chunk_seconds_bucket{{source="{s}",le="{le}"}} {cumulative}')
+            lines.append(f"{p}_source_chunk_seconds_sum{_labels(source=s)} {histogram.sum}")
+            lines.append(f"{p}_source_chunk_seconds_count{_labels(source=s)} {histogram.count}")
+
+        for name, writer in self.log_writers.items():
+            for key, value in writer.stats().items():
+                lines.append(f"{p}_log_{key}{_labels(logger=name)} {value}")
+
+        return "\n".join(lines) + "\n"
+
+    def summary(self, previous):
+        # previous maps channel key -> (lines, bytes) at the last summary and is updated in place
+        parts = []
+        for key, channel, seen in self.channel_snapshot():
+            lines, bytes_ = previous.get(key, (0, 0))
+            parts.append(f"{key[1]}: {channel.lines - lines} lines {channel.bytes - bytes_} B "
+                         f"idle {self.seconds_since(seen):.0f}s")
+            previous[key] = (channel.lines, channel.bytes)
+        for name, source in self.sources.items():
+            parts.append(f"{name}: unrouted {source.unrouted} decode errors {source.decode_errors}")
+        return " | ".join(parts)
+
+
+def start_metrics_server(registry, port, host="127.0.0.1"):
+    class MetricsRequestHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics_server", daemon=True).start()
+    return server
+
+
+class MetricsReporter(threading.Thread):
+    def __init__(self, registry, logger, summary_interval=60.0, sample_interval=1.0):
+        super().__init__(name="metrics_reporter", daemon=True)
+        self.registry = registry
+        self.logger = logger
+        self.summary_interval = summary_interval
+        self.sample_interval = sample_interval
+        self.stop_event = threading.Event()
+
+    def run(self):
+        previous = {}
+        next_summary = time.monotonic() + self.summary_interval
+        while not self.stop_event.wait(self.sample_interval):
+            self.registry.sample()
+            if self.summary_interval and time.monotonic() >= next_summary:
+                self.logger.info(self.registry.summary(previous))
+                next_summary += self.summary_interval
+
+    def stop(self):
+        self.stop_event.set()
@@ -0,0 +1,229 @@
+from concurrent.futures import ProcessPoolExecutor
+import csv
+import datetime
+import hashlib
+import json
+import multiprocessing
+import os
+import pickle
+
+from lib.external.pythontools.dict_adaptable import DictAdaptable
+from lib.internal.service.serial_ingest_service import iter_serial_lines
+
+MOLLY_CACHE_VERSION = 1
+MOLLY_TABLE_SPACING = 45
+MOLLY_HEADER_WIDTH = 148
+
+
+class KeyVault:
+    # The flora-keys CSV parsed once and indexed by DeviceID, to key the payload cache on each board's own row.
+    # Payloads themselves come from mCommon3, which reads the vault only for boards that miss the cache.
+    def __init__(self, path, key_column="DeviceID"):
+        self.path = path
+        with open(path, 'rb') as f:
+            data = f.read()
+        self.digest = hashlib.sha256(data).hexdigest()
+        reader = csv.DictReader(data.decode('utf-8-sig').splitlines())
+        self.indexed = key_column in (reader.fieldnames or [])
+        self.rows = {}
+        if self.indexed:
+            for row in reader:
+                self.rows[str(row[key_column]).strip().upper()] = row
+
+    def lookup(self, device_id):
+        return self.rows.get(str(device_id).strip().upper())
+
+    def row_digest(self, device_id):
+        # Only the board's own row matters for its payload; without a DeviceID column any vault edit invalidates
+        if not self.indexed:
+            return self.digest
+        return hashlib.sha256(json.dumps(self.lookup(device_id), sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def settings_to_dict(settings):
+    if isinstance(settings, DictAdaptable):
+        return {key: settings_to_dict(value) for key, value in sorted(vars(settings).items())}
+    if isinstance(settings, (list, tuple)):
+        return [settings_to_dict(value) for value in settings]
+    if isinstance(settings, (str, int, float, bool)) or settings is None:
+        return settings
+    return repr(settings)
+
+
+def generator_digest():
+    # Payload format changes in mCommon3 must invalidate the cache too
+    from lib.external.mCommon3.service import skyla_service
+    with open(skyla_service.__file__, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def payload_cache_key(settings, vault, generator):
+    material = {
+        "version": MOLLY_CACHE_VERSION,
+        "settings": settings_to_dict(settings),
+        "vault_row": vault.row_digest(settings.DeviceID),
+        "generator": generator,
+    }
+    return hashlib.sha256(json.dumps(material, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def generate_payload(settings):
+    from lib.external.mCommon3.service.skyla_service import update_app_key, update_net_key, update_creed_settings
+    from lib.external.mCommon3.service.skyla_service import update_keys_dataframe_from_vault, generate_skyla_payload
+
+    # mCommon3 loads the vault into this board's own settings, keyed by its DeviceID; boards never share that state
+    update_keys_dataframe_from_vault(settings)
+    update_app_key(settings)
+    update_net_key(settings)
+    update_creed_settings(settings)
+    return generate_skyla_payload(settings)
+
+
+def read_cached_payload(cache_path, key):
+    try:
+        with open(os.path.join(cache_path, key + ".pickle"), 'rb') as f:
+            return pickle.load(f)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+        return None
+
+
+def write_cached_payload(cache_path, key, payload):
+    os.makedirs(cache_path, exist_ok=True)
+    temp_path = os.path.join(cache_path, key + ".tmp")
+    with open(temp_path, 'wb') as f:
+        pickle.dump(payload, f)
+    os.replace(temp_path, os.path.join(cache_path, key + ".pickle"))
+
+
+def prepare_molly_payloads(boards, cache_path, logger):
+    # boards maps board name -> SkylaConfig; every payload is ready before the first serial session opens
+    vaults = {}
+    for settings in boards.values():
+        path = settings.KeyVault.KeysPath
+        if path not in vaults:
+            vaults[path] = KeyVault(path)
+
+    generator = generator_digest()
+    payloads = {}
+    keys = {}
+    for name, settings in boards.items():
+        keys[name] = payload_cache_key(settings, vaults[settings.KeyVault.KeysPath], generator)
+        cached = read_cached_payload(cache_path, keys[name]) if cache_path else None
+        if cached is not None:
+            logger.info(f"{name} payload unchanged, using cached payload.")
+            payloads[name] = cached
+
+    missing = [name for name in boards if name not in payloads]
+    if not missing:
+        return payloads
+
+    if len(missing) == 1:
+        generated = [generate_payload(boards[missing[0]])]
+    else:
+        with ProcessPoolExecutor(max_workers=min(len(missing), os.cpu_count() or 1),
+                                 mp_context=multiprocessing.get_context('fork')) as executor:
+            generated = list(executor.map(generate_payload, [boards[name] for name in missing]))
+
+    for name, payload in zip(missing, generated):
+        logger.info(f"{name} payload generated.")
+        payloads[name] = payload
+        if cache_path:
+            write_cached_payload(cache_path, keys[name], payload)
+    return payloads
+
+
+def run_molly_session(port, board, payload, echo=print):
+    # Board report lines look like S1|B|Key|Value (before) and S1|A|Key|Value (after)
+    result = {
+        "B": {},
+        "A": {}
+    }
+    port.write(board.Command.encode('ascii'))
+    for line in iter_serial_lines(port):
+        if echo:
+            echo(line)
+        if board.Prefix in line:
+            contents = line.split("|")
+            if len(contents) > 3 and contents[1] in result:
+                result[contents[1]][contents[2]] = contents[3]
+
+        if "send payload" in line:
+            port.write(payload)
+
+        if "molly complete" in line:
+            break
+    return result
+
+
+class MollyResultsStore:
+    # Append-only JSON lines, one record per board per run, so results can be compared across runs
+    def __init__(self, path):
+        self.path = path
+
+    def append(self, run, board, device_id, result):
+        record = {
+            "run": run,
+            "time": datetime.datetime.now().isoformat(timespec='seconds'),
+            "board": board,
+            "device_id": str(device_id) if device_id is not None else None,
+            "before": result["B"],
+            "after": result["A"],
+        }
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(record, sort_keys=True) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        return record
+
+    def query(self, board=None, device_id=None, run=None):
+        try:
+            f = open(self.path)
+        except FileNotFoundError:
+            return
+        with f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A run cut short by a power cut leaves a partial last line
+                    continue
+                if board and record["board"].lower() != board.lower():
+                    continue
+                if device_id and str(record["device_id"]).upper() != str(device_id).upper():
+                    continue
+                if run and record["run"] != run:
+                    continue
+                yield record
+
+
+def format_table_row(cells, spacing=MOLLY_TABLE_SPACING):
+    return "".join(cell.ljust(spacing) for cell in cells[:-1]) + cells[-1]
+
+
+def get_info_table(b, a):
+    rows = [format_table_row(['INFORMATION', 'BEFORE', 'AFTER'])]
+    for key, before in b.items():
+        after = a.get(key, "")
+        if isinstance(before, dict):
+            after = after if isinstance(after, dict) else {}
+            for nested_key, nested_before in before.items():
+                rows.append(format_table_row([f"{key}/{nested_key}:", str(nested_before),
+                                              str(after.get(nested_key, ""))]))
+        else:
+            rows.append(format_table_row([f"{key}:", str(before), str(after)]))
+    return "\n".join(rows) + "\n"
+
+
+def get_molly_header(board):
+    return f"=== {board.upper()} MOLLY OUTPUT ".ljust(MOLLY_HEADER_WIDTH, "=")
+
+
+def render_molly_result(record):
+    return "\n".join([
+        get_molly_header(record["board"]),
+        f"Run {record['run']} at {record['time']}, DeviceID {record['device_id']}",
+        get_info_table(record["before"], record["after"]),
+    ])
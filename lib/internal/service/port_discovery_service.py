@@ -0,0 +1,94 @@
+import json
+import os
+import time
+
+from lib.internal.service.fs_watch_service import DirectoryWatcher, IN_CREATE
+
+
+def list_usb_ports():
+    from serial.tools import list_ports
+    return {port.device: port for port in list_ports.comports() if port.vid is not None}
+
+
+class UsbPortMap:
+    # Board name -> USB serial number learned from the order the radios were powered on, so later startups bind
+    # each card by identity and no longer depend on enumeration order
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.entries = json.load(f)
+
+    def get(self, name):
+        return self.entries.get(name)
+
+    def learn(self, name, serial_number):
+        if not serial_number or self.entries.get(name) == serial_number:
+            return
+        self.entries[name] = serial_number
+        if not self.path:
+            return
+        temp_path = self.path + ".tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(self.entries, f, indent=1, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+
+
+class PortDiscovery:
+    # Binds USB serial ports the moment they enumerate. Creating the /dev node wakes the scan through inotify;
+    # without inotify it rescans every poll_interval. Ports present when discovery starts are never taken as "new",
+    # and a port is handed out at most once.
+    def __init__(self, dev_dir="/dev", poll_interval=0.1):
+        self.watcher = DirectoryWatcher([dev_dir], IN_CREATE, poll_interval)
+        self.baseline = set(list_usb_ports())
+        self.claimed = set()
+
+    def find(self, serial_number=None, exclude_serials=(), or_new=False):
+        # or_new falls back to a new port when none has the serial number, for a card replaced since it was learned
+        new = None
+        for device, port in sorted(list_usb_ports().items()):
+            if device in self.claimed:
+                continue
+            if serial_number and port.serial_number == serial_number:
+                return port
+            if (not serial_number or or_new) and new is None and device not in self.baseline and \
+                    port.serial_number not in exclude_serials:
+                new = port
+        return new
+
+    def wait_for(self, serial_number=None, deadline=None, exclude_serials=(), or_new=False):
+        # serial_number None takes the first new port that does not belong to another known board
+        while 1:
+            port = self.find(serial_number, exclude_serials, or_new)
+            if port is not None:
+                self.claimed.add(port.device)
+                return port
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return None
+            events = self.watcher.wait(remaining)
+            while events and not any(name.startswith("tty") for _, name, _ in events):
+                # Some other /dev node, keep waiting without rescanning
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                events = self.watcher.wait(remaining)
+
+    def close(self):
+        self.watcher.close()
+
+
+def open_serial_port(device, baud, deadline, timeout=1):
+    # The node can exist a few milliseconds before udev has applied its permissions; retry until the deadline
+    import serial
+
+    while 1:
+        try:
+            return serial.Serial(device, baud, timeout=timeout)
+        except serial.SerialException:
+            if time.monotonic() >= deadline:
+                raise
+            time.sleep(0.02)
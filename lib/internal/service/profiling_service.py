@@ -0,0 +1,181 @@
+import datetime
+import os
+import signal
+import sys
+import threading
+import time
+
+
+class Span:
+    __slots__ = ('name', 'seconds', 'count')
+
+    def __init__(self, name):
+        self.name = name
+        self.seconds = 0.0
+        self.count = 0
+
+    def add(self, seconds):
+        self.seconds += seconds
+        self.count += 1
+
+
+class LoopSpans:
+    # Accumulated time per stage of one loop since the last summary. Loops only pay for this while it is attached.
+    def __init__(self, name, span_names):
+        self.name = name
+        self.spans = [Span(span_name) for span_name in span_names]
+        self.by_name = {span.name: span for span in self.spans}
+        self.started = time.perf_counter()
+
+    def get(self, *names):
+        return [self.by_name[name] for name in names]
+
+    def __getitem__(self, name):
+        return self.by_name[name]
+
+    def summary(self):
+        now = time.perf_counter()
+        wall = max(now - self.started, 1e-9)
+        parts = []
+        busy = 0.0
+        for span in self.spans:
+            if not span.count:
+                continue
+            busy += span.seconds
+            parts.append(f"{span.name} {100 * span.seconds / wall:.1f}% {span.count}x "
+                         f"{1e6 * span.seconds / span.count:.1f}us")
+            span.seconds = 0.0
+            span.count = 0
+        self.started = now
+        parts.append(f"busy {100 * busy / wall:.1f}% of {wall:.0f}s")
+        return f"{self.name}: " + " | ".join(parts)
+
+
+class SpanSlot:
+    # For loops that are plain functions: the loop reads slot.spans on every iteration
+    def __init__(self):
+        self.spans = None
+
+
+def collapse_stack(frame, thread_name):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    stack.append(thread_name)
+    return ";".join(reversed(stack))
+
+
+class SamplingProfiler(threading.Thread):
+    # Samples every thread's stack from outside, so the profiled loops run unmodified. Output is one
+    # "frame;frame;frame count" line per distinct stack, the collapsed format flamegraph.pl and speedscope read.
+    def __init__(self, path, duration=30.0, interval=0.005, logger=None):
+        super().__init__(name="sampling_profiler", daemon=True)
+        self.path = path
+        self.duration = duration
+        self.interval = interval
+        self.logger = logger
+        self.stacks = {}
+        self.samples = 0
+
+    def run(self):
+        own = threading.get_ident()
+        deadline = time.monotonic() + self.duration
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = collapse_stack(frame, names.get(ident, str(ident)))
+                self.stacks[stack] = self.stacks.get(stack, 0) + 1
+            self.samples += 1
+            time.sleep(self.interval)
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, 'w') as f:
+            for stack, count in sorted(self.stacks.items(), key=lambda item: -item[1]):
+                f.write(f"{stack} {count}\n")
+        if self.logger:
+            self.logger.info(f"Profile of {self.samples} samples written to {self.path}")
+
+
+class ProfilingControl(threading.Thread):
+    # SIGUSR1 or touching <path>/<name>.profile records one sampling profile. SIGUSR2 toggles the loop timing spans,
+    # as does creating or removing <path>/<name>.spans. Summaries of the spans are logged every summary_interval.
+    def __init__(self, name, path, logger, profile_seconds=30.0, sample_interval=0.005, summary_interval=60.0,
+                 spans=0):
+        super().__init__(name="profiling_control", daemon=True)
+        self.service = name
+        self.path = path
+        self.logger = logger
+        self.profile_seconds = profile_seconds
+        self.sample_interval = sample_interval
+        self.summary_interval = summary_interval
+        self.targets = []
+        self.spans_requested = bool(spans)
+        self.spans_enabled = False
+        self.profile_requested = threading.Event()
+        self.profiler = None
+        self.stop_event = threading.Event()
+
+    def register(self, name, owner, span_names):
+        # owner gets a LoopSpans assigned to its spans attribute while spans are on, and None otherwise
+        self.targets.append((name, owner, span_names))
+
+    def install_signals(self):
+        # Must be called from the main thread; the handlers only set flags for this thread to act on
+        signal.signal(signal.SIGUSR1, lambda signum, frame: self.profile_requested.set())
+        signal.signal(signal.SIGUSR2, lambda signum, frame: self.toggle_spans())
+
+    def toggle_spans(self):
+        self.spans_requested = not self.spans_requested
+
+    def flag_path(self, suffix):
+        return os.path.join(self.path, f"{self.service}.{suffix}")
+
+    def start_profile(self):
+        if self.profiler is not None and self.profiler.is_alive():
+            self.logger.info("Profile already running.")
+            return
+        output = os.path.join(self.path, datetime.datetime.now().strftime(f"{self.service}_%Y%m%d_%H%M%S.collapsed"))
+        self.logger.info(f"Profiling {self.service} for {self.profile_seconds}s ...")
+        self.profiler = SamplingProfiler(output, self.profile_seconds, self.sample_interval, self.logger)
+        self.profiler.start()
+
+    def set_spans(self, enabled):
+        for name, owner, span_names in self.targets:
+            owner.spans = LoopSpans(name, span_names) if enabled else None
+        self.spans_enabled = enabled
+        self.logger.info(f"Loop timing spans {'on' if enabled else 'off'}.")
+
+    def summarize(self):
+        for _, owner, _ in self.targets:
+            spans = owner.spans
+            if spans is not None:
+                self.logger.info(spans.summary())
+
+    def run(self):
+        os.makedirs(self.path, exist_ok=True)
+        next_summary = time.monotonic() + self.summary_interval
+        while not self.stop_event.wait(1.0):
+            profile_flag = self.flag_path("profile")
+            if os.path.exists(profile_flag):
+                os.remove(profile_flag)
+                self.profile_requested.set()
+            if self.profile_requested.is_set():
+                self.profile_requested.clear()
+                self.start_profile()
+
+            wanted = self.spans_requested or os.path.exists(self.flag_path("spans"))
+            if wanted != self.spans_enabled:
+                self.set_spans(wanted)
+                next_summary = time.monotonic() + self.summary_interval
+            if self.spans_enabled and time.monotonic() >= next_summary:
+                self.summarize()
+                next_summary += self.summary_interval
+
+    def stop(self):
+        self.stop_event.set()
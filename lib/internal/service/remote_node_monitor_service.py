@@ -1,192 +1,650 @@
+import atexit
 import datetime
+import json
 import logging
 from logging.handlers import TimedRotatingFileHandler
+import mmap
+import os
 import serial
+import signal
+import sys
 import time
 
+from lib.internal.model.remote_node_monitor import AnomalyConfig, MollyBoardConfig, MonitorChannelConfig
+from lib.internal.model.remote_node_monitor import NucleoPortConfig
 from lib.internal.model.remote_node_monitor import RemoteNodeMonitorConfig
+from lib.internal.service.anomaly_service import AnomalyMonitor, ChannelDetector, PatternCounter, make_pattern_emit
+from lib.internal.service.blues_service import BLUES_TRACE_REQUEST, BluesPortReader, BluesTraceParser
+from lib.internal.service.blues_service import BluesTraceTimer, run_blues_readers
+from lib.internal.service.capture_service import RawCaptureWriter, ReplayClock, make_replay_emit
+from lib.internal.service.capture_service import read_capture_metadata, replay_capture
+from lib.internal.service.config_reload_service import SETTINGS_EVENTS, ConfigReloader, settings_changed
+from lib.internal.service.drive_sync_service import DriveSyncSchedule, SyncManifest, get_manifest_path
+from lib.internal.service.drive_sync_service import is_rotated_log, remove_uploaded_log, rename_rotated_logs
+from lib.internal.service.drive_sync_service import sync_logs
+from lib.internal.service.firmware_service import FlashCache, ProgrammingResult, append_programming_results
+from lib.internal.service.firmware_service import format_programming_summary, load_hex_images
+from lib.internal.service.fs_watch_service import DirectoryWatcher, IN_CREATE, IN_MOVED_TO
+from lib.internal.service.group_commit_service import GroupCommitFileHandler, GroupCommitMixin
+from lib.internal.service.group_commit_service import GroupCommitTimedRotatingFileHandler
+from lib.internal.service.line_buffer_service import DEFAULT_LINE_BUFFER_SOCKET, LineRing, make_ring_emit
+from lib.internal.service.line_buffer_service import send_monitor_command, start_line_buffer_server
+from lib.internal.service.log_compression_service import LogCompressor, needs_compression
+from lib.internal.service.log_store_service import BatchLogStoreHandler, LogStoreHandler
+from lib.internal.service.log_writer_service import BatchFileHandler, BatchStreamHandler
+from lib.internal.service.log_writer_service import BatchTimedRotatingFileHandler, start_log_writer
+from lib.internal.service.metrics_service import MetricsRegistry, MetricsReporter, start_metrics_server
+from lib.internal.service.molly_service import MollyResultsStore, get_info_table, get_molly_header, settings_to_dict
+from lib.internal.service.molly_service import prepare_molly_payloads, run_molly_session
+from lib.internal.service.port_discovery_service import PortDiscovery, UsbPortMap, open_serial_port
+from lib.internal.service.profiling_service import ProfilingControl, SpanSlot
+from lib.internal.service.serial_ingest_service import IngestChannel, IngestLoopControl, SerialLineIngest
+from lib.internal.service.serial_ingest_service import run_ingest_loop
+from lib.internal.service.upload_service import UploadScheduler, get_upload_transport
 
 from lib.external.mCommon3.service.avrdude_service import program_board
 
 
-def setup_logger(name, log_file, level=logging.INFO, rotating=1):
-    formatter = logging.Formatter('%(asctime)s %(message)s')
-    if rotating:
-        handler = TimedRotatingFileHandler(log_file, when="midnight", interval=1)
-        handler.suffix = "%Y%m%d"
-        handler.setFormatter(formatter)
-    else:
-        handler = logging.FileHandler(filename=log_file)
-        handler.setFormatter(formatter)
-
-    stream_handler = logging.StreamHandler()
-    stream_handler.setFormatter(formatter)
-
+def setup_logger(name, log_file, level=logging.INFO, **options):
     logger = logging.getLogger(name)
     logger.setLevel(level)
-    logger.addHandler(handler)
-    logger.addHandler(stream_handler)
-
+    for handler in build_log_handlers(name, log_file, **options):
+        logger.addHandler(handler)
     return logger
 
 
-def run_monitor_application(config: RemoteNodeMonitorConfig):
-    config.Nucleo.Serial = serial.Serial(config.Nucleo.Port, config.Nucleo.Baud)
-    config.Nucleo.Serial.close()
-    config.Nucleo.Serial.open()
+def replace_log_file(logger, log_file, **options):
+    swap_log_handlers(logger, build_log_handlers(logger.name, log_file, **options))
 
-    skyla1_logger = setup_logger('skyla1', config.Skyla1.LogFilePath)
-    creed1_logger = setup_logger('creed1', config.Creed1.LogFilePath)
-    skyla2_logger = setup_logger('skyla2', config.Skyla2.LogFilePath)
-    creed2_logger = setup_logger('creed2', config.Creed2.LogFilePath)
 
-    skyla1_logger.info("Script startup.")
-    creed1_logger.info("Script startup.")
-    skyla2_logger.info("Script startup.")
-    creed2_logger.info("Script startup.")
+def swap_log_handlers(logger, handlers):
+    # The new handlers are complete before the swap, so a line logged meanwhile goes to either the old or the new file
+    old_handlers = logger.handlers
+    logger.handlers = handlers
+    close_log_handlers(old_handlers)
 
-    while 1:
-        line = config.Nucleo.Serial.readline()
-        if line:
-            print(line)
-            try:
-                line = line.decode('utf-8').strip()
-            except:
-                pass
-            prefix = line[:3]
-            if prefix == "S1|":
-                skyla1_logger.info(line[3:])
-            elif prefix == "C1|":
-                creed1_logger.info(line[3:])
-            elif prefix == "S2|":
-                skyla2_logger.info(line[3:])
-            elif prefix == "C2|":
-                creed2_logger.info(line[3:])
-
-
-def run_drive_sync_application(config: RemoteNodeMonitorConfig):
-    from pyrclone import Rclone
-    from pyrclone import RcloneError
-    import os
 
+def close_log_handlers(handlers):
+    for handler in handlers:
+        writer = getattr(handler, 'writer', None)
+        if writer is not None:
+            # Drains what is queued into the old files first; start_log_writer's exit hook is no longer needed
+            atexit.unregister(writer.stop)
+            writer.stop()
+            for h in writer.handlers:
+                h.close()
+        handler.close()
+
+
+def build_log_handlers(name, log_file, rotating=1, queued=0, queue_size=10000, batch_size=256, flush_interval=1.0,
+                       log_store=None, group_commit=None, console=1):
+    formatter = logging.Formatter('%(asctime)s %(message)s')
+    if group_commit:
+        commit_options = {
+            "page_size": group_commit.PageSize or 4096,
+            "max_latency": group_commit.MaxLatencySeconds or 2.0,
+            "fsync_interval": group_commit.FsyncIntervalSeconds or 10.0,
+        }
+        if rotating:
+            handler = GroupCommitTimedRotatingFileHandler(log_file, when="midnight", interval=1, **commit_options)
+            handler.suffix = "%Y%m%d"
+        else:
+            handler = GroupCommitFileHandler(log_file, **commit_options)
+        handler.setFormatter(formatter)
+    elif rotating:
+        handler_class = BatchTimedRotatingFileHandler if queued else TimedRotatingFileHandler
+        handler = handler_class(log_file, when="midnight", interval=1)
+        handler.suffix = "%Y%m%d"
+        handler.setFormatter(formatter)
+    else:
+        handler_class = BatchFileHandler if queued else logging.FileHandler
+        handler = handler_class(filename=log_file)
+        handler.setFormatter(formatter)
+
+    handlers = [handler]
+    if console:
+        stream_handler = BatchStreamHandler() if queued else logging.StreamHandler()
+        stream_handler.setFormatter(formatter)
+        handlers.append(stream_handler)
+
+    if log_store:
+        store_handler_class = BatchLogStoreHandler if queued else LogStoreHandler
+        handlers.append(store_handler_class(log_store.Path, name, log_store.SegmentBytes or 16 * 1024 * 1024,
+                                            log_store.IndexIntervalBytes or 64 * 1024))
+
+    if queued:
+        return [start_log_writer(name, handlers, queue_size, batch_size, flush_interval)]
+    return handlers
+
+
+def get_logger_options(config: RemoteNodeMonitorConfig):
+    options = {}
+    if not config.Logging:
+        return options
+    if config.Logging.Queued:
+        options.update({
+            "queued": 1,
+            "queue_size": config.Logging.QueueSize or 10000,
+            "batch_size": config.Logging.BatchSize or 256,
+            "flush_interval": config.Logging.FlushIntervalSeconds or 1.0,
+        })
+    if config.Logging.GroupCommit and config.Logging.GroupCommit.Enabled:
+        options["group_commit"] = config.Logging.GroupCommit
+    return options
+
+
+def get_log_key(log_file, options):
+    # Compares by value: a reload builds new config objects even when nothing in them changed
+    return log_file, json.dumps({key: settings_to_dict(value) for key, value in options.items()}, sort_keys=True)
+
+
+def register_logger_metrics(registry: MetricsRegistry, logger):
+    for handler in logger.handlers:
+        writer = getattr(handler, 'writer', None)
+        if writer is not None:
+            registry.register_log_writer(logger.name, writer)
+        for h in writer.handlers if writer is not None else [handler]:
+            if isinstance(h, GroupCommitMixin):
+                registry.register_log_writer(f"{logger.name}_commit", h)
+
+
+def start_metrics(config: RemoteNodeMonitorConfig, registry: MetricsRegistry, name, port):
+    metrics_logger = setup_logger(f'{name}_metrics', config.GoogleDrive.LocalLogPath + f'/{name}_metrics.log')
+    if port:
+        start_metrics_server(registry, port, config.Metrics.Host or "127.0.0.1")
+    reporter = MetricsReporter(registry, metrics_logger, config.Metrics.SummaryIntervalSeconds or 60)
+    reporter.start()
+    return reporter
+
+
+def start_profiling(config: RemoteNodeMonitorConfig, name, logger, targets):
+    # targets are (span name, owner, span names); owners expose a spans attribute
+    if not (config.Profiling and config.Profiling.Enabled):
+        return None
+    profiling = config.Profiling
+    control = ProfilingControl(name, profiling.Path or os.path.join(config.GoogleDrive.LocalLogPath, "profiles"),
+                               logger,
+                               profile_seconds=profiling.ProfileSeconds or 30.0,
+                               sample_interval=(profiling.SampleIntervalMs or 5.0) / 1000,
+                               summary_interval=profiling.SummaryIntervalSeconds or 60,
+                               spans=profiling.Spans)
+    for target in targets:
+        control.register(*target)
+    control.install_signals()
+    control.start()
+    return control
+
+
+def get_monitor_channels(config: RemoteNodeMonitorConfig):
+    if config.MonitorChannels:
+        return [c if isinstance(c, MonitorChannelConfig) else MonitorChannelConfig(c) for c in config.MonitorChannels]
+
+    # Legacy layout: four boards with fixed prefixes on the single Nucleo port
+    return [
+        MonitorChannelConfig({"Name": "skyla1", "Prefix": "S1|", "LogFilePath": config.Skyla1.LogFilePath}),
+        MonitorChannelConfig({"Name": "creed1", "Prefix": "C1|", "LogFilePath": config.Creed1.LogFilePath}),
+        MonitorChannelConfig({"Name": "skyla2", "Prefix": "S2|", "LogFilePath": config.Skyla2.LogFilePath}),
+        MonitorChannelConfig({"Name": "creed2", "Prefix": "C2|", "LogFilePath": config.Creed2.LogFilePath}),
+    ]
+
+
+def get_monitor_sources(config: RemoteNodeMonitorConfig):
+    sources = {"Nucleo": config.Nucleo}
+    for port in config.NucleoPorts or []:
+        port = port if isinstance(port, NucleoPortConfig) else NucleoPortConfig(port)
+        sources[port.Name] = port
+    return sources
+
+
+def get_anomaly_options(anomaly: AnomalyConfig):
+    return {
+        "gap_factor": anomaly.GapFactor or 5.0,
+        "min_gap": anomaly.MinGapSeconds or 30.0,
+        "spike_factor": anomaly.SpikeFactor or 5.0,
+        "rate_window": anomaly.RateWindowSeconds or 10.0,
+        "min_spike_lines": anomaly.MinSpikeLines or 50,
+        "reset_window": anomaly.ResetWindowSeconds or 3600.0,
+        "reset_loop_count": anomaly.ResetLoopCount or 3,
+    }
+
+
+def get_monitor_log_options(config: RemoteNodeMonitorConfig):
+    log_options = get_logger_options(config)
+    if config.LogStore and config.LogStore.Path:
+        log_options["log_store"] = config.LogStore
+    return log_options
+
+
+class MonitorChannelState:
+    def __init__(self, name, logger, channel):
+        self.name = name
+        self.logger = logger
+        self.channel = channel
+        self.source = None
+        self.log_key = None
+        self.patterns = None
+        self.ring = None
+        self.detector = None
+
+
+class MonitorChannelPlan:
+    # One channel's part of a pending apply(): everything that can fail is built here, nothing live is touched yet
+    def __init__(self, name, state, source, prefix, log_key):
+        self.name = name
+        self.state = state
+        self.source = source
+        self.prefix = prefix
+        self.log_key = log_key
+        self.handlers = None
+        self.patterns = None
+        self.ring = None
+        self.detector = None
+        self.anomaly_options = None
+
+
+class MonitorChannelSet:
+    # Everything hanging off each monitored board: logger, IngestChannel, line ring and anomaly detector. apply()
+    # produces the routing tables for a configuration and keeps whatever did not change, so line counters, rings and
+    # learned intervals survive a settings reload.
+    def __init__(self, registry):
+        self.registry = registry
+        self.states = {}
+        self.routes = {}
+        self.rings = {}
+        self.detectors = []
+
+    def apply(self, config: RemoteNodeMonitorConfig, sources):
+        # Builds the whole new configuration first and only then swaps it in, so a bad log path or reset pattern on
+        # any channel leaves every channel as it was
+        plans = self.prepare(config, sources)
+        return self.commit(plans, sources)
+
+    def prepare(self, config: RemoteNodeMonitorConfig, sources):
+        channels = get_monitor_channels(config)
+        for channel in channels:
+            if (channel.Source or "Nucleo") not in sources:
+                raise ValueError(f"Monitor channel {channel.Name} uses unknown or unopened source {channel.Source}")
+
+        log_options = get_monitor_log_options(config)
+        anomaly = config.Anomaly if config.Anomaly and config.Anomaly.Enabled else None
+        line_buffer = config.LineBuffer if config.LineBuffer and config.LineBuffer.Enabled else None
+        patterns = list(anomaly.ResetPatterns) if anomaly and anomaly.ResetPatterns else None
+        lines = (line_buffer.Lines or 1000) if line_buffer else 0
+        plans = []
+        try:
+            for channel in channels:
+                state = self.states.get(channel.Name)
+                plan = MonitorChannelPlan(channel.Name, state, channel.Source or "Nucleo",
+                                          channel.Prefix.encode('utf-8'), get_log_key(channel.LogFilePath, log_options))
+                plans.append(plan)
+                if state is None or plan.log_key != state.log_key:
+                    plan.handlers = build_log_handlers(channel.Name, channel.LogFilePath, **log_options)
+
+                # Counters, rings and detectors are reused where their settings did not change
+                if patterns is not None:
+                    same = state is not None and state.patterns is not None and state.patterns.patterns == patterns
+                    plan.patterns = state.patterns if same else PatternCounter(patterns)
+                if lines:
+                    same = state is not None and state.ring is not None and state.ring.capacity == lines
+                    plan.ring = state.ring if same else LineRing(lines)
+                if anomaly:
+                    plan.detector = state.detector if state is not None else None
+                    plan.anomaly_options = get_anomaly_options(anomaly)
+        except Exception:
+            for plan in plans:
+                if plan.handlers:
+                    close_log_handlers(plan.handlers)
+            raise
+        return plans
+
+    def commit(self, plans, sources):
+        changes = []
+        states = {}
+        routes = {source: {} for source in sources}
+        for plan in plans:
+            state = plan.state
+            if state is None:
+                logger = logging.getLogger(plan.name)
+                logger.setLevel(logging.INFO)
+                state = MonitorChannelState(plan.name, logger, IngestChannel(plan.name, logger.info))
+                changes.append(f"added {plan.name}")
+            elif plan.handlers is not None:
+                changes.append(f"{plan.name} logs to {plan.log_key[0]}")
+            if plan.handlers is not None:
+                swap_log_handlers(state.logger, plan.handlers)
+                if plan.state is None:
+                    state.logger.info("Script startup.")
+            state.log_key = plan.log_key
+            register_logger_metrics(self.registry, state.logger)
+
+            if plan.source != state.source:
+                if state.source is not None:
+                    self.registry.unregister_channel(state.source, plan.name)
+                    changes.append(f"{plan.name} moved to {plan.source}")
+                self.registry.register_channel(plan.source, state.channel)
+                state.source = plan.source
+
+            emit = state.logger.info
+            state.patterns = plan.patterns
+            if state.patterns is not None:
+                emit = make_pattern_emit(emit, state.patterns)
+            state.ring = plan.ring
+            if state.ring is not None:
+                emit = make_ring_emit(emit, state.ring)
+            state.channel.emit = emit
+
+            if plan.anomaly_options is None:
+                state.detector = None
+            elif plan.detector is None:
+                state.detector = ChannelDetector(plan.source, state.channel, state.patterns, **plan.anomaly_options)
+            else:
+                state.detector = plan.detector
+                state.detector.source = plan.source
+                state.detector.patterns = state.patterns
+                state.detector.configure(**plan.anomaly_options)
+
+            routes[plan.source][plan.prefix] = state.channel
+            states[plan.name] = state
+
+        for name, state in self.states.items():
+            if name not in states:
+                self.registry.unregister_channel(state.source, name)
+                swap_log_handlers(state.logger, [])
+                changes.append(f"removed {name}")
+
+        self.states = states
+        self.routes = routes
+        self.rings = {name: state.ring for name, state in states.items() if state.ring is not None}
+        self.detectors = [state.detector for state in states.values() if state.detector is not None]
+        return changes
+
+
+def run_monitor_application(config: RemoteNodeMonitorConfig, settings=None):
+    # settings is a SettingsFiles; with it the monitor follows edits to the YAML files while the ports stay open
+    sources = get_monitor_sources(config)
+    registry = MetricsRegistry()
+    channel_set = MonitorChannelSet(registry)
+    used = {channel.Source or "Nucleo" for channel in get_monitor_channels(config)}
+    channel_set.apply(config, {name: sources[name] for name in used if name in sources})
+
+    ingests = {}
+    for source, source_routes in channel_set.routes.items():
+        port = sources[source]
+        port.Serial = serial.Serial(port.Port, port.Baud)
+        port.Serial.close()
+        port.Serial.open()
+        ingest = SerialLineIngest(port.Serial, source_routes, name=source)
+        if config.Capture and config.Capture.Enabled:
+            ingest.capture = RawCaptureWriter(
+                os.path.join(config.Capture.Path, datetime.datetime.now().strftime(f"{source}_%Y%m%d_%H%M%S.cap")),
+                source)
+            atexit.register(ingest.capture.close)
+        registry.register_source(source, ingest)
+        ingests[source] = ingest
+
+    reporter = None
+    if config.Metrics and config.Metrics.Enabled:
+        reporter = start_metrics(config, registry, 'monitor', config.Metrics.MonitorPort)
+
+    control = IngestLoopControl()
+    monitor_logger = setup_logger('monitor', config.GoogleDrive.LocalLogPath + '/monitor.log')
+
+    def handoff(action, args):
+        source = args[0] if args else "Nucleo"
+        if source not in ingests:
+            return f"unknown source {source}"
+        getattr(control, action)(ingests[source])
+        monitor_logger.info(f"{source} port {action}d on request.")
+        return f"{action}d {source}"
+
+    server = start_line_buffer_server(channel_set.rings, config.LineBuffer and config.LineBuffer.SocketPath or
+                                      DEFAULT_LINE_BUFFER_SOCKET,
+                                      commands={"release": lambda args: handoff("release", args),
+                                                "resume": lambda args: handoff("resume", args)})
+
+    profile_logger = setup_logger('monitor_profile', config.GoogleDrive.LocalLogPath + '/monitor_profile.log')
+    start_profiling(config, 'monitor', profile_logger,
+                    [(f"ingest {ingest.name}", ingest, ingest.SPAN_NAMES) for ingest in ingests.values()])
+
+    anomaly_monitor = None
+
+    def start_anomaly_monitor(config):
+        anomaly = config.Anomaly
+        alert_logger = setup_logger('alerts', anomaly.LogFilePath or config.GoogleDrive.LocalLogPath + '/alerts.log')
+        monitor = AnomalyMonitor(channel_set.detectors, alert_logger.warning)
+        monitor.start()
+        return monitor
+
+    if channel_set.detectors:
+        anomaly_monitor = start_anomaly_monitor(config)
+
+    def apply_config(new_config):
+        nonlocal anomaly_monitor
+        changes = channel_set.apply(new_config, {name: sources[name] for name in ingests})
+        for source, ingest in ingests.items():
+            ingest.set_routes(channel_set.routes[source])
+        server.rings = channel_set.rings
+        if anomaly_monitor is not None:
+            anomaly_monitor.detectors = channel_set.detectors
+        elif channel_set.detectors:
+            anomaly_monitor = start_anomaly_monitor(new_config)
+        if reporter is not None and new_config.Metrics:
+            reporter.summary_interval = new_config.Metrics.SummaryIntervalSeconds or 60
+        monitor_logger.info("Settings reloaded" + (": " + ", ".join(changes) if changes else ", no channel changes."))
+
+    if settings is not None:
+        ConfigReloader(settings, apply_config, monitor_logger).start()
+
+    # A service stop sends SIGTERM; exiting normally runs the exit hooks that drain the log writers and close captures
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    run_ingest_loop(list(ingests.values()), control)
+
+
+def run_replay_application(config: RemoteNodeMonitorConfig, capture_path, output_path, speed=None):
+    with open(capture_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+        source = read_capture_metadata(view)[0]["source"]
+
+    os.makedirs(output_path, exist_ok=True)
+    clock = ReplayClock()
+    routes = {}
+    for channel in get_monitor_channels(config):
+        if (channel.Source or "Nucleo") == source:
+            logger = setup_logger(f"replay_{channel.Name}", os.path.join(output_path, channel.Name + ".log"),
+                                  rotating=0, console=0)
+            logger.propagate = False
+            routes[channel.Prefix.encode('utf-8')] = IngestChannel(channel.Name, make_replay_emit(logger, clock))
+    if not routes:
+        raise ValueError(f"No monitor channels are configured for capture source {source}")
+
+    ingest = SerialLineIngest(None, routes, name=source)
+    started = time.monotonic()
+    _, chunks, total_bytes = replay_capture(capture_path, ingest, clock, speed)
+    elapsed = time.monotonic() - started
+    print(f"Replayed {chunks} chunks, {total_bytes} bytes, "
+          f"{ingest.lines} lines in {elapsed:.2f}s into {output_path} "
+          f"(unrouted {ingest.unrouted}, decode errors {ingest.decode_errors})")
+
+
+def run_drive_sync_application(config: RemoteNodeMonitorConfig, settings=None):
     logger = setup_logger('rclone_logger', config.GoogleDrive.LocalLogPath+'/ggl_dr_sync.log')
     logger.info("Starting google drive sync script ...")
-
-    if config.GoogleDrive.Mode == 1:
-        timer_start = time.time()
-        while 1:
-            if time.time() - timer_start > config.GoogleDrive.SyncFrequency:
-                output = Rclone().copy(config.GoogleDrive.LocalLogPath, config.GoogleDrive.RemoteLogPath)
-
-                if output.return_code is not RcloneError.SUCCESS:
-                    logger.info(output.error)
-                else:
-                    for f in os.listdir(config.GoogleDrive.LocalLogPath):
-                        if f[0].isnumeric():
-                            os.remove(os.path.join(config.GoogleDrive.LocalLogPath, f))
-                    logger.info("Google drive updated.")
-                timer_start = time.time()
-
-            file_list = os.listdir(config.GoogleDrive.LocalLogPath)
-            filtered_file_list = [file for file in file_list if file[-1].isnumeric()]
-            if filtered_file_list:
-                for file in filtered_file_list:
-                    new_filename = file[-8:] + "_" + file[:-9]
-                    logger.info(f"Renaming {file} to {new_filename}")
-                    os.rename(os.path.join(config.GoogleDrive.LocalLogPath, file),
-                              os.path.join(config.GoogleDrive.LocalLogPath, new_filename))
-    elif config.GoogleDrive.Mode == 2:
-        last_date_synced = ""
+    if config.GoogleDrive.Mode == 2:
         logger.info(datetime.datetime.now().hour)
-        while 1:
-            current_date = datetime.datetime.now()
-            if current_date.day != last_date_synced:
-                if current_date.hour == config.GoogleDrive.ResetDailyTime:
-                    last_date_synced = current_date.day
-                    output = Rclone().copy(config.GoogleDrive.LocalLogPath, config.GoogleDrive.RemoteLogPath)
-
-                    if output.return_code is not RcloneError.SUCCESS:
-                        logger.info(output.error)
-                    else:
-                        for f in os.listdir(config.GoogleDrive.LocalLogPath):
-                            if f[0].isnumeric():
-                                os.remove(os.path.join(config.GoogleDrive.LocalLogPath, f))
-                        logger.info("Google drive updated.")
-
-            file_list = os.listdir(config.GoogleDrive.LocalLogPath)
-            filtered_file_list = [file for file in file_list if file[-1].isnumeric()]
-            if filtered_file_list:
-                for file in filtered_file_list:
-                    new_filename = file[-8:] + "_" + file[:-9]
-                    logger.info(f"Renaming {file} to {new_filename}")
-                    os.rename(os.path.join(config.GoogleDrive.LocalLogPath, file),
-                              os.path.join(config.GoogleDrive.LocalLogPath, new_filename))
-
-
-def run_programming_sequence(config: RemoteNodeMonitorConfig, brd_name):
-    programming_attempts = 2
+
+    # Sleep until a log rotates into the directory or the next sync is due instead of polling os.listdir
+    directories = [config.GoogleDrive.LocalLogPath]
+    reloader = None
+    if settings is not None:
+        # The settings files share the loop's watcher so a schedule change is picked up without waiting out the old one
+        directories += [directory for directory in settings.directories if os.path.isdir(directory)]
+
+        def apply_config(new_config):
+            drive = new_config.GoogleDrive
+            # The compressor, transport and workers are built once at startup
+            for key in ("LocalLogPath", "RemoteLogPath", "Compression", "CompressionCpuBudget", "Transport",
+                        "UploadWorkers"):
+                if getattr(drive, key) != getattr(config.GoogleDrive, key):
+                    logger.info(f"{key} changed, restart the drive sync service to follow it.")
+                    setattr(drive, key, getattr(config.GoogleDrive, key))
+            transport.set_bandwidth(drive.BandwidthKBps or 0)
+            scheduler.initial_backoff = drive.RetryInitialSeconds or 5.0
+            scheduler.max_backoff = drive.RetryMaxSeconds or 300.0
+            schedule.config = drive
+            logger.info(f"Settings reloaded, mode {drive.Mode}.")
+
+        reloader = ConfigReloader(settings, apply_config, logger)
+    watcher = DirectoryWatcher(directories, IN_CREATE | IN_MOVED_TO | (SETTINGS_EVENTS if settings else 0))
+    schedule = DriveSyncSchedule(config.GoogleDrive)
+    manifest = SyncManifest(get_manifest_path(config.GoogleDrive))
+    local_log_path = config.GoogleDrive.LocalLogPath
+    transport = get_upload_transport(config.GoogleDrive)
+    scheduler = UploadScheduler(local_log_path, transport, manifest, logger, config.GoogleDrive.UploadWorkers or 2,
+                                config.GoogleDrive.RetryInitialSeconds or 5.0,
+                                config.GoogleDrive.RetryMaxSeconds or 300.0,
+                                on_uploaded=lambda name: remove_uploaded_log(local_log_path, name, manifest))
+    scheduler.start()
+
+    compressor = None
+    if config.GoogleDrive.Compression:
+        compressor = LogCompressor(config.GoogleDrive.LocalLogPath, config.GoogleDrive.Compression, logger,
+                                   config.GoogleDrive.CompressionCpuBudget or 0.25)
+        compressor.start()
+
+    slot = SpanSlot()
+    start_profiling(config, 'drive_sync', logger, [("drive sync", slot, ('wait', 'rename', 'sync'))])
+
+    rename_rotated_logs(config.GoogleDrive.LocalLogPath, logger)
+    if compressor:
+        compressor.submit_pending()
+    clock = time.perf_counter
+    while 1:
+        spans = slot.spans
+        started = clock()
+        events = watcher.wait(schedule.seconds_until_due())
+        if spans:
+            spans['wait'].add(clock() - started)
+        if reloader is not None and settings_changed(settings, events):
+            # Let an editor finish writing; events arriving meanwhile stay queued for the next wait
+            time.sleep(reloader.debounce)
+            reloader.reload()
+        if events is None or any(is_rotated_log(name) for _, name, _ in events):
+            started = clock()
+            renamed = rename_rotated_logs(config.GoogleDrive.LocalLogPath, logger)
+            if compressor:
+                for file_name in renamed:
+                    if needs_compression(file_name):
+                        compressor.submit(file_name)
+            if spans:
+                spans['rename'].add(clock() - started)
+
+        if schedule.due():
+            started = clock()
+            # Only queues the files; uploads and their retries carry on between syncs
+            sync_logs(schedule.config, scheduler, compressor)
+            schedule.mark_synced()
+            if spans:
+                spans['sync'].add(clock() - started)
+
+
+PROGRAMMING_RELAYS = (("Skyla1", 1), ("Creed1", 2), ("Skyla2", 3), ("Creed2", 4))
+
+
+def run_programming_sequence(config: RemoteNodeMonitorConfig, brd_name, result=None):
+    programming_attempts = (config.Programming and config.Programming.Attempts) or 2
     print(f"Programming {brd_name}")
     for p in range(0, programming_attempts):
+        started = time.monotonic()
         try:
             programming_output = program_board(config.Programmer)
         except:
             print("Programming timed out.")
-            if p == programming_attempts - 1:
-                print(f"Failed programming {brd_name}.")
-            else:
-                print(f"Attempting program again ... {p + 1}/{programming_attempts}")
+            verified = False
         else:
-            if b'verified' in programming_output.stdout:
-                print(f"Programming {brd_name} Successful!!!!!")
-                break
-            else:
+            verified = b'verified' in programming_output.stdout
+            if not verified:
                 print("Board programming not verified.")
-                if p == programming_attempts - 1:
-                    print(f"Failed programming {brd_name}.")
-                else:
-                    print(f"Attempting program again ... {p + 1}/{programming_attempts}")
+        if result is not None:
+            result.attempts += 1
+            result.attempt_seconds.append(time.monotonic() - started)
+
+        if verified:
+            print(f"Programming {brd_name} Successful!!!!!")
+            return True
+        if p == programming_attempts - 1:
+            print(f"Failed programming {brd_name}.")
+        else:
+            print(f"Attempting program again ... {p + 1}/{programming_attempts}")
+    return False
 
 
-def run_programming_application(config: RemoteNodeMonitorConfig):
+def get_flash_cache_path(config: RemoteNodeMonitorConfig, hex_paths):
+    if config.Programming and config.Programming.CachePath:
+        return config.Programming.CachePath
+    directory = os.path.dirname(hex_paths[0]) if hex_paths else ""
+    return os.path.join(directory, ".flash_cache.json")
+
+
+def run_programming_application(config: RemoteNodeMonitorConfig, force=0):
     import piplates.RELAYplate as RelayHat
 
+    boards = [(name, relay, getattr(config, name)) for name, relay in PROGRAMMING_RELAYS]
+    boards = [(name, relay, board) for name, relay, board in boards if board.Program]
+
+    # Every image is parsed and validated before any relay is touched
+    images = load_hex_images([board.ProgrammingHexPath for _, _, board in boards])
+    cache = FlashCache(get_flash_cache_path(config, [board.ProgrammingHexPath for _, _, board in boards]))
+    skip_identical = not force and config.Programming and config.Programming.SkipIdentical
+    run = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+
     RelayHat.relayOFF(0, 1)  # Skyla1 UPDI
     RelayHat.relayOFF(0, 2)  # Creed1 UPDI
     RelayHat.relayOFF(0, 3)  # Skyla2 UPDI
     RelayHat.relayOFF(0, 4)  # Creed2 UPDI
     RelayHat.relayON(0, 5)   # PWR EN
 
-    if config.Skyla1.Program:
-        RelayHat.relayON(0, 1)
-        config.Programmer.HexPath = config.Skyla1.ProgrammingHexPath
-        run_programming_sequence(config, 'Skyla1')
-        RelayHat.relayOFF(0, 1)
-
-    if config.Creed1.Program:
-        RelayHat.relayON(0, 2)
-        config.Programmer.HexPath = config.Creed1.ProgrammingHexPath
-        run_programming_sequence(config, 'Creed1')
-        RelayHat.relayOFF(0, 2)
-
-    if config.Skyla2.Program:
-        RelayHat.relayON(0, 3)
-        config.Programmer.HexPath = config.Skyla2.ProgrammingHexPath
-        run_programming_sequence(config, 'Skyla2')
-        RelayHat.relayOFF(0, 3)
-
-    if config.Creed2.Program:
-        RelayHat.relayON(0, 4)
-        config.Programmer.HexPath = config.Creed2.ProgrammingHexPath
-        run_programming_sequence(config, 'Creed2')
-        RelayHat.relayOFF(0, 4)
+    results = []
+    for name, relay, board in boards:
+        image = images[board.ProgrammingHexPath]
+        if isinstance(image, Exception):
+            result = ProgrammingResult(name, board.ProgrammingHexPath)
+            print(f"Not programming {name}: {image}")
+            result.finish("invalid", str(image))
+            results.append(result)
+            continue
+
+        result = ProgrammingResult(name, image.path, image.digest)
+        results.append(result)
+        if skip_identical and cache.matches(name, image):
+            print(f"{name} already has {os.path.basename(image.path)}, skipping.")
+            result.finish("skipped")
+            continue
+
+        # A failed attempt can leave the board with neither image
+        cache.forget(name)
+        RelayHat.relayON(0, relay)
+        config.Programmer.HexPath = board.ProgrammingHexPath
+        verified = run_programming_sequence(config, name, result)
+        RelayHat.relayOFF(0, relay)
+        if verified:
+            cache.confirm(name, image)
+        result.finish("verified" if verified else "failed")
+
+    print(format_programming_summary(results))
+    if config.Programming and config.Programming.ResultsPath:
+        append_programming_results(config.Programming.ResultsPath, run, results)
 
     print("Application complete. Exiting. Please reboot pi now.")
 
 
-def run_controller_application(config: RemoteNodeMonitorConfig):
+def run_controller_application(config: RemoteNodeMonitorConfig, settings=None):
     import subprocess
     import piplates.RELAYplate as RelayHat
-    from serial.tools import list_ports
+
+    discovery_config = config.PortDiscovery
+    power_off_seconds = discovery_config.PowerOffSeconds if discovery_config and \
+        discovery_config.PowerOffSeconds is not None else 1.0
+    timeout = (discovery_config and discovery_config.TimeoutSeconds) or 10.0
+    port_map = UsbPortMap(discovery_config and discovery_config.PortMapPath)
 
     # Set off state for relays
     RelayHat.relayOFF(0, 1)     # Skyla1 UPDI
@@ -197,79 +655,119 @@ def run_controller_application(config: RemoteNodeMonitorConfig):
     RelayHat.relayOFF(0, 6)     # Radio Module 1
     RelayHat.relayOFF(0, 7)     # Radio Module 2
 
-    print("Waiting 10 seconds before starting up skyla ...")
-    for i in range(1, 11):
-        print(f"Progress: {i}/10 seconds", end='\r')
-        time.sleep(1)
-
     # Blues logger setup
-    blues1_logger = setup_logger('blues_logger1', config.GoogleDrive.LocalLogPath + '/blues1.log')
-    blues2_logger = setup_logger('blues_logger2', config.GoogleDrive.LocalLogPath + '/blues2.log')
+    log_options = get_logger_options(config)
+    blues1_logger = setup_logger('blues_logger1', config.GoogleDrive.LocalLogPath + '/blues1.log', **log_options)
+    blues2_logger = setup_logger('blues_logger2', config.GoogleDrive.LocalLogPath + '/blues2.log', **log_options)
     blues1_logger.info("Starting blues notecard 1 logging script ...")
     blues2_logger.info("Starting blues notecard 2 logging script ...")
 
-    # Find blues module serial ports
-    ports_before_list = list_ports.comports()
+    print(f"Holding boards off for {power_off_seconds} seconds ...")
+    time.sleep(power_off_seconds)
+
+    # Ports present while the radios are off are never taken for a card
+    discovery = PortDiscovery()
+    cards = [
+        ('blues1', 'Creed1', 6, config.Creed1.Blues, blues1_logger),     # Radio Module 1
+        ('blues2', 'Creed2', 7, config.Creed2.Blues, blues2_logger),     # Radio Module 2
+    ]
+    serial_numbers = {board: blues.UsbSerial or port_map.get(board) for _, board, _, blues, _ in cards}
+    known = {serial_number for serial_number in serial_numbers.values() if serial_number}
+
     RelayHat.relayON(0, 5)      # Skyla1 and Skyla2 pwr_en
-    RelayHat.relayON(0, 6)      # Radio Module 1
-    time.sleep(2)
-    ports_middle_list = list_ports.comports()
-    for port in ports_middle_list:
-        if port not in ports_before_list:
-            config.Creed1.Blues.Serial.Port = port.device
-
-    RelayHat.relayON(0, 7)      # Radio Module 2
-    time.sleep(2)
-    ports_end_list = list_ports.comports()
-    for port in ports_end_list:
-        if port not in ports_middle_list:
-            config.Creed2.Blues.Serial.Port = port.device
-
-    if not config.Creed1.Blues.Serial.Port and not config.Creed2.Blues.Serial.Port:
+    found = {}
+    deadlines = {}
+    # Cards with a known serial claim their ports first, so an unknown card never takes one of them. Each card is
+    # powered on alone: the new port that belongs to no other known card is its own, also when a learned card was
+    # replaced since the last run.
+    for _, board, relay, blues, logger in sorted(cards, key=lambda card: not serial_numbers[card[1]]):
+        RelayHat.relayON(0, relay)
+        deadlines[board] = time.monotonic() + timeout
+        serial_number = serial_numbers[board]
+        # A configured serial is binding; a learned one gives way to a replacement card
+        found[board] = port = discovery.wait_for(serial_number, deadlines[board], known,
+                                                 or_new=not blues.UsbSerial)
+        if port is None:
+            logger.info(f"No port enumerated for {board} within {timeout} seconds, not logging it.")
+            continue
+        logger.info(f"{board} Blues card on {port.device}, USB serial {port.serial_number}.")
+        if not blues.UsbSerial:
+            if serial_number and port.serial_number != serial_number:
+                logger.warning(f"{board} Blues card changed: learned USB serial {serial_number}, now "
+                               f"{port.serial_number} on {port.device}.")
+            port_map.learn(board, port.serial_number)
+        blues.Serial.Port = port.device
+    discovery.close()
+
+    readers = []
+    summary_loggers = {}
+    for name, board, _, blues, logger in cards:
+        if found[board] is None:
+            continue
+        parser = None
+        if config.BluesSummaryIntervalSeconds:
+            summary_loggers[name] = setup_logger(f'{name}_summary_logger',
+                                                 config.GoogleDrive.LocalLogPath + f'/{name}_summary.log', console=0)
+            parser = BluesTraceParser(name, summary_loggers[name].info, config.BluesSummaryIntervalSeconds)
+        # Each card has its own reader thread, so the timeout only bounds how quickly a reader notices a stop request
+        blues.Serial.Serial = open_serial_port(blues.Serial.Port, blues.Serial.Baud, deadlines[board] + timeout)
+        blues.Serial.Serial.write(BLUES_TRACE_REQUEST)
+        readers.append(BluesPortReader(name, blues.Serial.Serial, logger, parser))
+
+    if not readers:
         blues1_logger.info("No port found for both Blues cards. Exiting.")
         blues2_logger.info("No port found for both Blues cards. Exiting.")
-
-    if not config.Creed1.Blues.Serial.Port:
-        for port in ports_before_list:
-            if "ACM" in port.device:
-                config.Creed1.Blues.Serial.Port = port.device
-
-    if not config.Creed2.Blues.Serial.Port:
-        for port in ports_before_list:
-            if "ACM" in port.device:
-                config.Creed2.Blues.Serial.Port = port.device
-
-    config.Creed1.Blues.Serial.Serial = serial.Serial(config.Creed1.Blues.Serial.Port, config.Creed1.Blues.Serial.Baud,
-                                                      timeout=10)
-    config.Creed2.Blues.Serial.Serial = serial.Serial(config.Creed2.Blues.Serial.Port, config.Creed2.Blues.Serial.Baud,
-                                                      timeout=10)
-    config.Creed1.Blues.Serial.Serial.close()
-    config.Creed2.Blues.Serial.Serial.close()
-    config.Creed1.Blues.Serial.Serial.open()
-    config.Creed2.Blues.Serial.Serial.open()
-
-    config.Creed1.Blues.Serial.Serial.write(b'{"req":"card.trace","trace":"+mdmmax", "mode":"on"}\r\n')
-    config.Creed2.Blues.Serial.Serial.write(b'{"req":"card.trace","trace":"+mdmmax", "mode":"on"}\r\n')
+        return
 
     reset_command = f'sudo st-flash reset'
     subprocess.run(reset_command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=30)
 
-    start_time = time.time()
-    while 1:
-        if time.time() - start_time > (config.BluesTraceFrequencyMinutes*60):
-            blues1_logger.info("Sending trace message again ----------------------------------------------------------")
-            blues2_logger.info("Sending trace message again ----------------------------------------------------------")
-            config.Creed1.Blues.Serial.Serial.write(b'{"req":"card.trace","trace":"+mdmmax", "mode":"on"}\r\n')
-            config.Creed2.Blues.Serial.Serial.write(b'{"req":"card.trace","trace":"+mdmmax", "mode":"on"}\r\n')
-            start_time = time.time()
-
-        blues1_line = config.Creed1.Blues.Serial.Serial.readline()
-        blues2_line = config.Creed2.Blues.Serial.Serial.readline()
-
-        if blues1_line:
-            blues1_logger.info(blues1_line)
-        if blues2_line:
-            blues2_logger.info(blues2_line)
+    profile_logger = setup_logger('controller_profile', config.GoogleDrive.LocalLogPath + '/controller_profile.log')
+    start_profiling(config, 'controller', profile_logger,
+                    [(f"reader {reader.channel.name}", reader, reader.SPAN_NAMES) for reader in readers])
+
+    registry = None
+    if config.Metrics and config.Metrics.Enabled:
+        registry = MetricsRegistry()
+        for reader in readers:
+            registry.register_channel(reader.port.port, reader.channel)
+            register_logger_metrics(registry, reader.logger)
+        start_metrics(config, registry, 'controller', config.Metrics.ControllerPort)
+
+    timer = BluesTraceTimer(readers, config.BluesTraceFrequencyMinutes * 60)
+    if settings is not None:
+        controller_logger = setup_logger('controller', config.GoogleDrive.LocalLogPath + '/controller.log')
+        current = {"log_key": get_log_key(config.GoogleDrive.LocalLogPath, log_options)}
+
+        def apply_config(new_config):
+            changes = []
+            period_seconds = new_config.BluesTraceFrequencyMinutes * 60
+            if period_seconds != timer.period_seconds:
+                timer.set_period(period_seconds)
+                changes.append(f"trace every {new_config.BluesTraceFrequencyMinutes} minutes")
+            for reader in readers:
+                if reader.parser is not None and new_config.BluesSummaryIntervalSeconds:
+                    reader.parser.summary_interval = new_config.BluesSummaryIntervalSeconds
+            new_log_options = get_logger_options(new_config)
+            log_path = new_config.GoogleDrive.LocalLogPath
+            log_key = get_log_key(log_path, new_log_options)
+            if log_key != current["log_key"]:
+                # Ports stay open, each card's lines go to the new files from the next line on
+                for reader in readers:
+                    name = reader.channel.name
+                    replace_log_file(reader.logger, log_path + f'/{name}.log', **new_log_options)
+                    if registry is not None:
+                        # The new handlers come with new writers; report those instead of the stopped ones
+                        register_logger_metrics(registry, reader.logger)
+                    if name in summary_loggers:
+                        replace_log_file(summary_loggers[name], log_path + f'/{name}_summary.log', console=0)
+                current["log_key"] = log_key
+                changes.append(f"logs in {log_path}")
+            controller_logger.info("Settings reloaded" + (": " + ", ".join(changes) if changes else ", no changes."))
+
+        ConfigReloader(settings, apply_config, controller_logger).start()
+
+    run_blues_readers(readers, timer)
 
 
 def run_reset_application():
@@ -301,147 +799,86 @@ def run_init_relays():
     RelayHat.relayOFF(0, 7)     # Radio Module 2
 
 
-def get_info_table(b, a):
-    spacer_amount = 45
+def get_molly_boards(config: RemoteNodeMonitorConfig):
+    if config.MollyBoards:
+        return [b if isinstance(b, MollyBoardConfig) else MollyBoardConfig(b) for b in config.MollyBoards]
+
+    # Legacy layout: Skyla1 and Skyla2 behind fixed Nucleo commands
+    return [
+        MollyBoardConfig({"Name": "Skyla1", "Command": "p", "Prefix": "S1|", "Molly": config.Skyla1.Molly,
+                          "Settings": config.Skyla1.Settings}),
+        MollyBoardConfig({"Name": "Skyla2", "Command": "q", "Prefix": "S2|", "Molly": config.Skyla2.Molly,
+                          "Settings": config.Skyla2.Settings}),
+    ]
 
-    headings = ['INFORMATION', 'BEFORE', 'AFTER']
-    string = (headings[0] + (" " * (spacer_amount - len(headings[0]))) + headings[1] + (
-                " " * (spacer_amount - len(headings[1]))) + headings[2] + '\n')
-    for key in b:
-        if type(b[key]) == dict:
-            for nested_key in b[key]:
-                intro = key + '/' + nested_key + ":"
-                string += intro + (" " * (spacer_amount - len(intro))) + str(b[key][nested_key]) + (
-                            " " * (spacer_amount - len(str(b[key][nested_key])))) + "%s\n" % a[key][nested_key]
-        else:
-            intro = key + ":"
-            string += intro + (" " * (spacer_amount - len(intro))) + str(b[key]) + (
-                        " " * (spacer_amount - len(str(b[key])))) + "%s\n" % a[key]
 
-    return string
+def get_molly_results_path(config: RemoteNodeMonitorConfig):
+    return config.MollyResultsPath or os.path.join(config.GoogleDrive.LocalLogPath, "molly_results.jsonl")
 
 
 def run_molly(config: RemoteNodeMonitorConfig):
-    from lib.external.mCommon3.service.skyla_service import update_app_key, update_net_key, update_creed_settings
-    from lib.external.mCommon3.service.skyla_service import update_keys_dataframe_from_vault, generate_skyla_payload
     import subprocess
-    import datetime
 
-    monitor_stop_command = f'sudo systemctl stop remoteNodeMonitor.service'
-    subprocess.run(monitor_stop_command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=30)
-
-    reset_command = f'sudo st-flash reset'
-    out = subprocess.run(reset_command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=30)
-    print(out.stdout)
-
-    config.Nucleo.Serial = serial.Serial(port=config.Nucleo.Port, baudrate=config.Nucleo.Baud)
-
-    config.Nucleo.Serial.close()
-    config.Nucleo.Serial.open()
-
-    molly_logger_file_name = config.GoogleDrive.LocalLogPath + datetime.datetime.now().strftime(
-        "/%Y%m%d_%H%M%S_molly.log")
+    run = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    molly_logger_file_name = config.GoogleDrive.LocalLogPath + f"/{run}_molly.log"
     molly_logger = setup_logger("molly_logger", molly_logger_file_name, rotating=1)
 
-    if not config.Skyla1.Molly and not config.Skyla2.Molly:
-        molly_logger.info(
-            "Both Skyla1 and Skyla2 have 'Molly' set to false in settings_molly file. Update and try again.")
+    boards = [board for board in get_molly_boards(config) if board.Molly]
+    if not boards:
+        molly_logger.info("Every board has 'Molly' set to false in settings_molly file. Update and try again.")
         molly_logger.info("Exiting.")
         exit(0)
 
-    if config.Skyla1.Molly:
-        update_keys_dataframe_from_vault(config.Skyla1.Settings)
-        update_app_key(config.Skyla1.Settings)
-        update_net_key(config.Skyla1.Settings)
-        update_creed_settings(config.Skyla1.Settings)
-        skyla1_payload = generate_skyla_payload(config.Skyla1.Settings)
-        molly_logger.info(f"Skyla1 payload: {skyla1_payload}")
-        run_reset_application()
-        molly_logger.info("Running Molly application on Skyla1 ...")
-        config.Nucleo.Serial.write(b'p')
-
-        skyla1_dict = {
-            "B": {},
-            "A": {}
-        }
-
-        while 1:
-            line = config.Nucleo.Serial.readline()
-            if line:
-                print(line)
-                try:
-                    line = line.decode('utf-8').strip()
-                except:
-                    continue
-                else:
-                    if "S1|" in line:
-                        try:
-                            contents = line.split("|")
-                            skyla1_dict[contents[1]][contents[2]] = contents[3]
-                        except:
-                            continue
-
-                    if "send payload" in line:
-                        config.Nucleo.Serial.write(skyla1_payload)
-
-                    if "molly complete" in line:
-                        break
-
-        molly_logger.info(
-            "=== SKYLA1 MOLLY OUTPUT ============================================================================"
-            "================================================")
-        molly_logger.info(get_info_table(skyla1_dict["B"], skyla1_dict["A"]))
-        molly_logger.info("Done Mollying Skyla1.")
-
-    reset_command = f'sudo st-flash reset'
-    out = subprocess.run(reset_command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=30)
-    print(out.stdout)
-
-    if config.Skyla2.Molly:
-        update_keys_dataframe_from_vault(config.Skyla2.Settings)
-        update_app_key(config.Skyla2.Settings)
-        update_net_key(config.Skyla2.Settings)
-        update_creed_settings(config.Skyla2.Settings)
-        skyla2_payload = generate_skyla_payload(config.Skyla2.Settings)
-        molly_logger.info(f"Skyla2 payload: {skyla2_payload}")
-        run_reset_application()
-        molly_logger.info("Running Molly application on Skyla2 ...")
-        config.Nucleo.Serial.write(b'q')
-
-        skyla2_dict = {
-            "B": {},
-            "A": {}
-        }
-
-        while 1:
-            line = config.Nucleo.Serial.readline()
-            if line:
-                print(line)
-                try:
-                    line = line.decode('utf-8').strip()
-                except:
-                    continue
-                else:
-                    if "S2|" in line:
-                        try:
-                            contents = line.split("|")
-                            skyla2_dict[contents[1]][contents[2]] = contents[3]
-                        except:
-                            continue
-
-                    if "send payload" in line:
-                        config.Nucleo.Serial.write(skyla2_payload)
-
-                    if "molly complete" in line:
-                        break
-
-        molly_logger.info(
-            "=== SKYLA2 MOLLY OUTPUT ============================================================================"
-            "================================================")
-        molly_logger.info(get_info_table(skyla2_dict["B"], skyla2_dict["A"]))
-        molly_logger.info("Done Mollying Skyla2.")
-
-    molly_logger.info("Exiting. Please reset Pi now.")
+    # Every payload is ready before the monitor hands over the Nucleo port and the first serial session opens
+    payloads = prepare_molly_payloads({board.Name: board.Settings for board in boards}, config.MollyCachePath,
+                                      molly_logger)
+    results = MollyResultsStore(get_molly_results_path(config))
+
+    # The running monitor closes the Nucleo port and keeps logging the Blues cards; no reply means it is not running
+    socket_path = config.LineBuffer and config.LineBuffer.SocketPath or DEFAULT_LINE_BUFFER_SOCKET
+    reply = send_monitor_command(socket_path, "release Nucleo")
+    monitor_released = reply is not None and reply.startswith("released")
+    molly_logger.info(f"Monitor: {reply}" if reply is not None else "No monitor running, opening the port directly.")
+    if reply is not None and not monitor_released:
+        exit(1)
+
+    try:
+        reset_command = f'sudo st-flash reset'
+        out = subprocess.run(reset_command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=30)
+        print(out.stdout)
+
+        config.Nucleo.Serial = serial.Serial(port=config.Nucleo.Port, baudrate=config.Nucleo.Baud)
+
+        config.Nucleo.Serial.close()
+        config.Nucleo.Serial.open()
+
+        for index, board in enumerate(boards):
+            if index:
+                out = subprocess.run(reset_command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                     timeout=30)
+                print(out.stdout)
+
+            payload = payloads[board.Name]
+            molly_logger.info(f"{board.Name} payload: {payload}")
+            run_reset_application()
+            molly_logger.info(f"Running Molly application on {board.Name} ...")
+            result = run_molly_session(config.Nucleo.Serial, board, payload)
+
+            record = results.append(run, board.Name, board.Settings.DeviceID, result)
+            molly_logger.info(get_molly_header(board.Name))
+            molly_logger.info(get_info_table(record["before"], record["after"]))
+            molly_logger.info(f"Done Mollying {board.Name}.")
+    finally:
+        if config.Nucleo.Serial is not None and config.Nucleo.Serial.is_open:
+            config.Nucleo.Serial.close()
+        if monitor_released:
+            molly_logger.info(f"Monitor: {send_monitor_command(socket_path, 'resume Nucleo')}")
+
+    molly_logger.info(f"Results appended to {results.path} as run {run}.")
+    if monitor_released:
+        molly_logger.info("Exiting. The monitor is logging the Nucleo again.")
+    else:
+        molly_logger.info("Exiting. Please reset Pi now.")
 
 
 def run_charger_app(config: RemoteNodeMonitorConfig):
@@ -0,0 +1,303 @@
+from collections import deque
+import os
+import selectors
+import threading
+import time
+
+
+class IngestChannel:
+    # Per-board counters are plain slot increments so the read loop pays nothing measurable for them
+    __slots__ = ('name', 'emit', 'lines', 'bytes', 'decode_errors')
+
+    def __init__(self, name, emit):
+        self.name = name
+        self.emit = emit
+        self.lines = 0
+        self.bytes = 0
+        self.decode_errors = 0
+
+
+class LineDecoder:
+    # Splits a byte stream into lines across reads. Lines are only decoded once complete, so a multibyte character
+    # split between two reads is reassembled, and invalid bytes become U+FFFD instead of raising. A line that runs
+    # past max_line without a newline (a board spewing noise) is cut at a character boundary, so the buffer and the
+    # per-line cost stay bounded.
+    def __init__(self, max_line=4096):
+        self.max_line = max_line
+        self.buffer = bytearray()
+        self.replaced = 0
+
+    def split(self, data):
+        buffer = self.buffer
+        buffer += data
+        lines = []
+        start = 0
+        while 1:
+            end = buffer.find(b'\n', start)
+            if end < 0:
+                break
+            lines.append(bytes(buffer[start:end]))
+            start = end + 1
+        while len(buffer) - start > self.max_line:
+            cut = start + self.max_line
+            # Never cut inside a UTF-8 sequence: back off over continuation bytes (0b10xxxxxx)
+            for _ in range(3):
+                if buffer[cut] & 0xC0 != 0x80:
+                    break
+                cut -= 1
+            lines.append(bytes(buffer[start:cut]))
+            start = cut
+        if start:
+            del buffer[:start]
+        return lines
+
+    def decode(self, line):
+        text = line.decode('utf-8', 'replace')
+        if '\ufffd' in text:
+            self.replaced += 1
+        return text
+
+    def feed(self, data):
+        return [self.decode(line) for line in (line.strip() for line in self.split(data)) if line]
+
+
+def iter_serial_lines(port, decoder=None, read_size=4096):
+    decoder = decoder or LineDecoder()
+    while 1:
+        waiting = port.in_waiting
+        data = port.read(min(waiting, read_size) if waiting else 1)
+        if data:
+            yield from decoder.feed(data)
+
+
+class SerialLineIngest:
+    SPAN_NAMES = ('read', 'capture', 'split', 'route', 'decode', 'write')
+
+    def __init__(self, port, routes, read_size=4096, name=None):
+        # routes maps a raw byte prefix (e.g. b"S1|") to an IngestChannel, or to a callable taking the decoded line
+        # without its prefix
+        self.port = port
+        self.name = name
+        self.routes, self.prefix_lengths, self.prefix_length = self.build_routes(routes)
+        # Routing tables from set_routes(), swapped in by the read loop between chunks
+        self.pending_routes = None
+        self.read_size = read_size
+        self.decoder = LineDecoder()
+
+        self.lines = 0
+        self.bytes = 0
+        self.decode_errors = 0
+        self.unrouted = 0
+        # Optional histogram with observe(seconds), timed once per chunk rather than per line
+        self.chunk_latency = None
+        # Optional RawCaptureWriter that records every chunk exactly as read
+        self.capture = None
+        # LoopSpans attached by ProfilingControl while loop timing is switched on
+        self.spans = None
+
+    @staticmethod
+    def build_routes(routes):
+        routes = {prefix: channel if isinstance(channel, IngestChannel) else IngestChannel(prefix, channel)
+                  for prefix, channel in routes.items()}
+        prefix_lengths = sorted({len(prefix) for prefix in routes}, reverse=True)
+        # Every board uses the same prefix length in practice, which allows a single dict lookup per line. With no
+        # routes at all, the empty prefix never matches and every line counts as unrouted.
+        prefix_length = prefix_lengths[0] if len(prefix_lengths) == 1 else None if prefix_lengths else 0
+        return routes, prefix_lengths, prefix_length
+
+    def set_routes(self, routes):
+        # Safe from any thread: no line is ever routed with half of the old tables and half of the new
+        self.pending_routes = self.build_routes(routes)
+
+    def poll(self):
+        if self.pending_routes is not None:
+            self.routes, self.prefix_lengths, self.prefix_length = self.pending_routes
+            self.pending_routes = None
+        spans = self.spans
+        if spans is not None:
+            started = time.perf_counter()
+        # Block for the first byte, then drain whatever else the UART already has queued in one read
+        waiting = self.port.in_waiting
+        data = self.port.read(min(waiting, self.read_size) if waiting else 1)
+        if spans is not None:
+            spans['read'].add(time.perf_counter() - started)
+        if not data:
+            return 0
+        self.bytes += len(data)
+        if self.capture is not None:
+            if spans is not None:
+                started = time.perf_counter()
+            self.capture.write(data)
+            if spans is not None:
+                spans['capture'].add(time.perf_counter() - started)
+        if spans is not None:
+            return self.feed_spans(data, spans)
+        if self.chunk_latency is None:
+            return self.feed(data)
+        started = time.perf_counter()
+        routed = self.feed(data)
+        self.chunk_latency.observe(time.perf_counter() - started)
+        return routed
+
+    def feed(self, data):
+        routed = 0
+        for line in self.decoder.split(data):
+            routed += self.route(line)
+        return routed
+
+    def find_channel(self, line):
+        # Returns (channel or None, prefix length)
+        prefix_length = self.prefix_length
+        if prefix_length is not None:
+            return self.routes.get(line[:prefix_length]), prefix_length
+        for prefix_length in self.prefix_lengths:
+            channel = self.routes.get(line[:prefix_length])
+            if channel is not None:
+                return channel, prefix_length
+        return None, 0
+
+    def decode_line(self, channel, line, prefix_length):
+        channel.lines += 1
+        channel.bytes += len(line)
+        text = line[prefix_length:].decode('utf-8', 'replace')
+        if '\ufffd' in text:
+            channel.decode_errors += 1
+            self.decode_errors += 1
+        return text
+
+    def route(self, line):
+        # Routed on the raw byte prefix before decoding, so a line with corrupt bytes still reaches its board's log
+        line = line.strip()
+        if not line:
+            return 0
+        self.lines += 1
+        channel, prefix_length = self.find_channel(line)
+        if channel is None:
+            self.unrouted += 1
+            return 0
+        channel.emit(self.decode_line(channel, line, prefix_length))
+        return 1
+
+    def feed_spans(self, data, spans):
+        # route() split into its timed stages, only used while spans are attached so feed() stays lean
+        clock = time.perf_counter
+        split, route, decode, write = spans.get('split', 'route', 'decode', 'write')
+        chunk_started = clock()
+        lines = self.decoder.split(data)
+        now = clock()
+        split.add(now - chunk_started)
+
+        routed = 0
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            self.lines += 1
+            channel, prefix_length = self.find_channel(line)
+            routed_at = clock()
+            route.add(routed_at - now)
+            now = routed_at
+            if channel is None:
+                self.unrouted += 1
+                continue
+            text = self.decode_line(channel, line, prefix_length)
+            decoded = clock()
+            decode.add(decoded - now)
+            channel.emit(text)
+            now = clock()
+            write.add(now - decoded)
+            routed += 1
+
+        if self.chunk_latency is not None:
+            self.chunk_latency.observe(now - chunk_started)
+        return routed
+
+    def run_forever(self):
+        while 1:
+            self.poll()
+            if self.capture is not None:
+                self.capture.flush_if_due()
+
+
+class IngestLoopControl:
+    # Runs functions on the read loop's own thread between polls, e.g. to hand a port to another process and take it
+    # back. A byte on the wake pipe gets the loop out of select().
+    def __init__(self):
+        self.wake_read, self.wake_write = os.pipe()
+        os.set_blocking(self.wake_read, False)
+        self.calls = deque()
+        self.selector = None
+
+    def call(self, function, timeout=10.0):
+        done = threading.Event()
+        result = {}
+
+        def run():
+            try:
+                result["value"] = function()
+            except Exception as e:
+                result["error"] = e
+            finally:
+                done.set()
+
+        self.calls.append(run)
+        os.write(self.wake_write, b'x')
+        if not done.wait(timeout):
+            raise TimeoutError("read loop did not respond")
+        if "error" in result:
+            raise result["error"]
+        return result.get("value")
+
+    def run_pending(self):
+        try:
+            os.read(self.wake_read, 4096)
+        except BlockingIOError:
+            pass
+        while self.calls:
+            self.calls.popleft()()
+
+    def release(self, ingest):
+        # Stops reading and closes the port so another process can open it
+        def release():
+            if ingest.port.is_open:
+                self.selector.unregister(ingest.port.fileno())
+                ingest.port.close()
+        self.call(release)
+
+    def resume(self, ingest):
+        def resume():
+            if not ingest.port.is_open:
+                ingest.port.open()
+                # Whatever half line was buffered before the release belongs to nothing now
+                ingest.decoder = LineDecoder(ingest.decoder.max_line)
+                self.selector.register(ingest.port.fileno(), selectors.EVENT_READ, ingest)
+        self.call(resume)
+
+
+def run_ingest_loop(ingests, control=None):
+    # One selector serves every source port; each wakeup drains only the ports that have data
+    if len(ingests) == 1 and not hasattr(ingests[0].port, 'fileno'):
+        ingests[0].run_forever()
+        return
+
+    captures = [ingest.capture for ingest in ingests if ingest.capture is not None]
+    # Wakes up at least once per flush interval so a capture is flushed even while every port is quiet
+    timeout = min(capture.flush_interval for capture in captures) if captures else None
+    with selectors.DefaultSelector() as selector:
+        for ingest in ingests:
+            selector.register(ingest.port.fileno(), selectors.EVENT_READ, ingest)
+        if control is not None:
+            control.selector = selector
+            selector.register(control.wake_read, selectors.EVENT_READ, control)
+        while 1:
+            woken = False
+            for key, _ in selector.select(timeout):
+                if key.data is control:
+                    woken = True
+                else:
+                    key.data.poll()
+            # After the ports, so a port released here is never polled from a stale event in the same batch
+            if woken:
+                control.run_pending()
+            for capture in captures:
+                capture.flush_if_due()
@@ -0,0 +1,276 @@
+import os
+import random
+import shutil
+import threading
+import time
+
+from lib.internal.service.log_compression_service import PARTIAL_SUFFIX
+
+
+class UploadError(Exception):
+    pass
+
+
+class TokenBucket:
+    # Shared by every upload of one transport, so the cap holds however many workers are copying
+    def __init__(self, rate=0, clock=time.monotonic):
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.set_rate(rate)
+
+    def set_rate(self, rate):
+        # bytes per second, 0 for no limit; one second's worth may go out in a burst
+        with self.lock:
+            self.rate = rate
+            self.tokens = rate
+            self.last = self.clock()
+
+    def take(self, count):
+        while 1:
+            with self.lock:
+                if not self.rate:
+                    return
+                now = self.clock()
+                self.tokens = min(self.rate, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                # A chunk bigger than the bucket still goes once the bucket is full
+                needed = min(count, self.rate)
+                if self.tokens >= needed:
+                    self.tokens -= count
+                    return
+                wait = (needed - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class RcloneTransport:
+    # One rclone process per file; rclone's own retries are off so UploadScheduler decides when to try again
+    def __init__(self, remote_path, bandwidth_kbps=0, workers=1):
+        self.remote_path = remote_path
+        self.workers = workers
+        self.bandwidth_kbps = bandwidth_kbps
+
+    def set_bandwidth(self, bandwidth_kbps):
+        self.bandwidth_kbps = bandwidth_kbps
+
+    def upload(self, path):
+        from pyrclone import Rclone
+        from pyrclone import RcloneError
+
+        flags = ["--retries", "1", "--low-level-retries", "3"]
+        if self.bandwidth_kbps:
+            # Each process gets an equal share of the cap
+            flags += ["--bwlimit", f"{max(1, self.bandwidth_kbps // self.workers)}k"]
+        output = Rclone().copy(path, self.remote_path, flags)
+        if output.return_code is not RcloneError.SUCCESS:
+            error = output.error
+            raise UploadError(" ".join(error) if isinstance(error, list) else str(error))
+
+
+class LocalDirectoryTransport:
+    # Copies into a directory standing in for the remote, with the same cap, for trying the scheduler without rclone.
+    # Files are written under a partial name and renamed, so the directory only ever holds complete copies.
+    def __init__(self, remote_path, bandwidth_kbps=0, chunk_size=64 * 1024):
+        self.remote_path = remote_path
+        self.chunk_size = chunk_size
+        self.bucket = TokenBucket(bandwidth_kbps * 1024)
+
+    def set_bandwidth(self, bandwidth_kbps):
+        self.bucket.set_rate(bandwidth_kbps * 1024)
+
+    def upload(self, path):
+        target = os.path.join(self.remote_path, os.path.basename(path))
+        partial = target + PARTIAL_SUFFIX
+        try:
+            os.makedirs(self.remote_path, exist_ok=True)
+            with open(path, 'rb') as source, open(partial, 'wb') as destination:
+                while 1:
+                    chunk = source.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    self.bucket.take(len(chunk))
+                    destination.write(chunk)
+            shutil.copystat(path, partial)
+            os.replace(partial, target)
+        except OSError as e:
+            raise UploadError(str(e))
+
+
+def get_upload_transport(config):
+    workers = config.UploadWorkers or 2
+    if config.Transport == "local":
+        return LocalDirectoryTransport(config.RemoteLogPath, config.BandwidthKBps or 0)
+    if config.Transport and config.Transport != "rclone":
+        raise ValueError(f"Unknown drive sync transport: {config.Transport}")
+    return RcloneTransport(config.RemoteLogPath, config.BandwidthKBps or 0, workers)
+
+
+class PendingUpload:
+    __slots__ = ('name', 'stat', 'digest', 'attempts', 'next_attempt')
+
+    def __init__(self, name, stat, digest):
+        self.name = name
+        self.stat = stat
+        self.digest = digest
+        self.attempts = 0
+        self.next_attempt = 0.0
+
+
+class UploadScheduler:
+    # A few workers upload the pending files oldest first. A failed file waits out its own exponential backoff while
+    # newer files go ahead, so one bad file never stalls the rest. Once different files fail in a row, as during an
+    # outage, the whole queue is held back too: then only one worker probes with the oldest ready file, at most
+    # max_backoff apart, and the first success lets every worker drain the backlog again.
+    def __init__(self, local_log_path, transport, manifest, logger, workers=2, initial_backoff=5.0, max_backoff=300.0,
+                 on_uploaded=None, clock=time.monotonic):
+        self.local_log_path = local_log_path
+        self.transport = transport
+        self.manifest = manifest
+        self.logger = logger
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        # Called with the file name after the manifest records it, still holding the scheduler's lock
+        self.on_uploaded = on_uploaded
+        self.clock = clock
+
+        self.condition = threading.Condition()
+        self.pending = {}
+        self.in_flight = set()
+        self.failures = 0
+        self.failed_names = set()
+        self.paused_until = 0.0
+        self.uploaded = 0
+        self.uploaded_bytes = 0
+        self.upload_seconds = 0.0
+        self.stopped = False
+        self.workers = [threading.Thread(target=self.work, name=f"upload_worker{index}", daemon=True)
+                        for index in range(workers)]
+
+    def start(self):
+        for worker in self.workers:
+            worker.start()
+
+    def backoff(self, attempts):
+        # Jitter keeps the workers and files that failed together from retrying in lockstep
+        return min(self.max_backoff, self.initial_backoff * 2 ** (attempts - 1)) * random.uniform(0.8, 1.0)
+
+    def submit(self, pending):
+        # pending is find_pending_uploads() output; a file already waiting is updated to its current contents and
+        # keeps its backoff
+        with self.condition:
+            for name, stat, digest in pending:
+                upload = self.pending.get(name)
+                if upload is None:
+                    self.pending[name] = PendingUpload(name, stat, digest)
+                else:
+                    upload.stat = stat
+                    upload.digest = digest
+            self.condition.notify_all()
+
+    def next_upload(self, now):
+        # Returns (upload or None, seconds until something could be ready)
+        if now < self.paused_until or (self.outage() and self.in_flight):
+            return None, max(self.paused_until - now, 0.0) or None
+        ready = [upload for name, upload in self.pending.items() if name not in self.in_flight]
+        if not ready:
+            return None, None
+        waiting = min(upload.next_attempt for upload in ready)
+        ready = [upload for upload in ready if upload.next_attempt <= now]
+        if not ready:
+            return None, waiting - now
+        return min(ready, key=lambda upload: (upload.stat.st_mtime_ns, upload.name)), None
+
+    def outage(self):
+        # More than one file failed since the last success: the outage, not the files, was at fault
+        return len(self.failed_names) > 1
+
+    def work(self):
+        while 1:
+            with self.condition:
+                while 1:
+                    if self.stopped:
+                        return
+                    upload, wait = self.next_upload(self.clock())
+                    if upload is not None:
+                        break
+                    self.condition.wait(wait)
+                self.in_flight.add(upload.name)
+                stat, digest = upload.stat, upload.digest
+
+            started = time.monotonic()
+            try:
+                self.transport.upload(os.path.join(self.local_log_path, upload.name))
+                error = None
+            except (UploadError, OSError) as e:
+                error = e
+            elapsed = time.monotonic() - started
+
+            with self.condition:
+                self.in_flight.discard(upload.name)
+                if error is None:
+                    self.finished(upload, stat, digest, elapsed)
+                else:
+                    self.failed(upload, error)
+                self.condition.notify_all()
+
+    def finished(self, upload, stat, digest, elapsed):
+        if self.outage():
+            self.logger.info(f"Uploads working again after {self.failures} failures, {len(self.pending)} files to go.")
+            # Drain strictly oldest first, the files were not at fault
+            for pending in self.pending.values():
+                pending.next_attempt = 0.0
+        self.failures = 0
+        self.failed_names.clear()
+        self.paused_until = 0.0
+        self.manifest.confirm(upload.name, stat, digest)
+        if upload.digest == digest:
+            # Not changed again while it was uploading
+            del self.pending[upload.name]
+        else:
+            upload.attempts = 0
+            upload.next_attempt = 0.0
+        if self.on_uploaded is not None:
+            self.on_uploaded(upload.name)
+        self.manifest.save()
+        self.uploaded += 1
+        self.uploaded_bytes += stat.st_size
+        self.upload_seconds += elapsed
+        if not self.pending:
+            self.logger.info(f"Google drive updated. Uploaded {self.uploaded} files, {self.uploaded_bytes} bytes "
+                             f"in {self.upload_seconds:.1f}s of transfers.")
+            self.uploaded = 0
+            self.uploaded_bytes = 0
+            self.upload_seconds = 0.0
+
+    def failed(self, upload, error):
+        if not os.path.exists(os.path.join(self.local_log_path, upload.name)):
+            # Renamed or removed meanwhile, the next scan picks up whatever replaced it
+            self.pending.pop(upload.name, None)
+            return
+        upload.attempts += 1
+        retry = self.backoff(upload.attempts)
+        upload.next_attempt = self.clock() + retry
+        self.failures += 1
+        self.failed_names.add(upload.name)
+        if self.outage():
+            self.paused_until = self.clock() + self.backoff(self.failures)
+        self.logger.info(f"Upload of {upload.name} failed (attempt {upload.attempts}), retrying in {retry:.0f}s: "
+                         f"{error}")
+
+    def idle(self):
+        with self.condition:
+            return not self.pending and not self.in_flight
+
+    def wait_idle(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            while self.pending or self.in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.condition.wait(remaining if remaining is not None else 1.0)
+            return True
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
@@ -0,0 +1,21 @@
+import argparse
+
+from lib.internal.service.benchmark_service import run_controller_pty_benchmark, run_ingest_benchmark
+from lib.internal.service.benchmark_service import run_monitor_pty_benchmark
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Monitor/controller throughput benchmarks, no hardware needed.")
+    parser.add_argument('mode', nargs='?', default='ingest', choices=['ingest', 'monitor', 'controller'],
+                        help="ingest: in-memory engine vs old readline loop, monitor/controller: pty stand-in ports")
+    parser.add_argument('--rate', type=int, help="offered lines/sec across all boards")
+    parser.add_argument('--line-size', type=int, help="bytes per line")
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds of generated traffic")
+    args = parser.parse_args()
+
+    if args.mode == 'ingest':
+        run_ingest_benchmark(line_size=args.line_size or 80)
+    elif args.mode == 'monitor':
+        run_monitor_pty_benchmark(args.rate or 2000, args.line_size or 80, args.duration)
+    else:
+        run_controller_pty_benchmark(args.rate or 200, args.line_size or 120, args.duration)
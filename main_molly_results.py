@@ -0,0 +1,31 @@
+import argparse
+from os import path
+
+from lib.external.pythontools.config import get_settings_dict_from_yaml
+from lib.internal.service.molly_service import MollyResultsStore, render_molly_result
+from lib.internal.service.remote_node_monitor_service import get_molly_results_path
+from lib.internal.model.remote_node_monitor import RemoteNodeMonitorConfig
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Print before/after tables from the Molly results store.")
+    parser.add_argument('-b', '--board', help="only this board, e.g. Skyla1")
+    parser.add_argument('-d', '--device', help="only this DeviceID")
+    parser.add_argument('-r', '--run', help="only this run, e.g. 20221003_140000")
+    parser.add_argument('-l', '--last', type=int, help="only the last N matching records")
+    parser.add_argument('-s', '--store', help="results path, defaults to MollyResultsPath from settings")
+    args = parser.parse_args()
+
+    store = args.store
+    if not store:
+        config = RemoteNodeMonitorConfig(
+            get_settings_dict_from_yaml(
+                path.join(path.dirname(path.abspath(__file__)), 'config', 'settings_config.yaml'),
+                path.dirname(path.abspath(__file__))
+            )
+        )
+        store = get_molly_results_path(config)
+
+    records = list(MollyResultsStore(store).query(args.board, args.device, args.run))
+    for record in records[-args.last:] if args.last else records:
+        print(render_molly_result(record))
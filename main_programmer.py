@@ -1,3 +1,4 @@
+import argparse
 from os import path
 
 from lib.external.pythontools.config import get_settings_dict_from_yaml
@@ -6,11 +7,17 @@ from lib.internal.model.remote_node_monitor import RemoteNodeMonitorConfig
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Program the boards with Program set in settings_programmer.")
+    parser.add_argument('-f', '--force', action='store_true',
+                        help="reflash even boards whose last verified flash was the same image")
+    args = parser.parse_args()
+
     run_programming_application(
         RemoteNodeMonitorConfig(
             get_settings_dict_from_yaml(
                 path.join(path.dirname(path.abspath(__file__)), 'config', 'settings_config.yaml'),
                 path.dirname(path.abspath(__file__))
             )
-        )
+        ),
+        force=args.force
     )
@@ -0,0 +1,34 @@
+import argparse
+import datetime
+from os import path
+
+from lib.external.pythontools.config import get_settings_dict_from_yaml
+from lib.internal.service.log_store_service import query_log_store
+from lib.internal.model.remote_node_monitor import RemoteNodeMonitorConfig
+
+
+def parse_time(value):
+    return datetime.datetime.fromisoformat(value).timestamp()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Query the time-indexed board log store.")
+    parser.add_argument('board', help="skyla1, creed1, skyla2 or creed2")
+    parser.add_argument('start', type=parse_time, help="ISO time, e.g. 2022-10-03T14:00")
+    parser.add_argument('end', type=parse_time, help="ISO time, e.g. 2022-10-03T15:00")
+    parser.add_argument('-c', '--contains', help="only lines containing this substring")
+    parser.add_argument('-s', '--store', help="log store path, defaults to LogStore.Path from settings")
+    args = parser.parse_args()
+
+    store = args.store
+    if not store:
+        config = RemoteNodeMonitorConfig(
+            get_settings_dict_from_yaml(
+                path.join(path.dirname(path.abspath(__file__)), 'config', 'settings_config.yaml'),
+                path.dirname(path.abspath(__file__))
+            )
+        )
+        store = config.LogStore.Path
+
+    for timestamp, message in query_log_store(store, args.board, args.start, args.end, args.contains):
+        print(f"{datetime.datetime.fromtimestamp(timestamp).isoformat(sep=' ', timespec='milliseconds')} {message}")
@@ -0,0 +1,27 @@
+import argparse
+from os import path
+
+from lib.external.pythontools.config import get_settings_dict_from_yaml
+from lib.internal.service.remote_node_monitor_service import run_replay_application
+from lib.internal.model.remote_node_monitor import RemoteNodeMonitorConfig
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Replay a raw Nucleo capture through the monitor demux.")
+    parser.add_argument('capture', help="capture file written with Capture.Enabled")
+    parser.add_argument('output', help="directory for the re-derived board logs")
+    parser.add_argument('--speed', type=float, help="1 replays in real time, 10 ten times faster; default is as fast "
+                                                     "as possible")
+    args = parser.parse_args()
+
+    run_replay_application(
+        RemoteNodeMonitorConfig(
+            get_settings_dict_from_yaml(
+                path.join(path.dirname(path.abspath(__file__)), 'config', 'settings_config.yaml'),
+                path.dirname(path.abspath(__file__))
+            )
+        ),
+        args.capture,
+        args.output,
+        args.speed
+    )
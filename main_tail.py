@@ -0,0 +1,42 @@
+import argparse
+from os import path
+import sys
+
+from lib.external.pythontools.config import get_settings_dict_from_yaml
+from lib.internal.service.line_buffer_service import DEFAULT_LINE_BUFFER_SOCKET, request_line_buffer
+from lib.internal.model.remote_node_monitor import RemoteNodeMonitorConfig
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Recent board lines from the running monitor, without reading logs.")
+    parser.add_argument('channel', nargs='?', help="skyla1, creed1, skyla2 or creed2; omit to list channels")
+    parser.add_argument('-n', '--lines', type=int, help="number of lines")
+    parser.add_argument('-f', '--follow', action='store_true', help="keep printing new lines, * follows every board")
+    parser.add_argument('-a', '--all', action='store_true', help="snapshot of every board merged by time")
+    parser.add_argument('-s', '--socket', help="monitor socket, defaults to LineBuffer.SocketPath from settings")
+    args = parser.parse_args()
+
+    socket_path = args.socket
+    if not socket_path:
+        config = RemoteNodeMonitorConfig(
+            get_settings_dict_from_yaml(
+                path.join(path.dirname(path.abspath(__file__)), 'config', 'settings_config.yaml'),
+                path.dirname(path.abspath(__file__))
+            )
+        )
+        socket_path = (config.LineBuffer and config.LineBuffer.SocketPath) or DEFAULT_LINE_BUFFER_SOCKET
+
+    count = "" if args.lines is None else f" {args.lines}"
+    if args.all:
+        request = "snapshot" + count
+    elif args.follow:
+        request = f"follow {args.channel or '*'}" + count
+    elif args.channel:
+        request = f"tail {args.channel}" + count
+    else:
+        request = "channels"
+
+    try:
+        request_line_buffer(socket_path, request, sys.stdout)
+    except KeyboardInterrupt:
+        pass
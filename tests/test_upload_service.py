@@ -0,0 +1,257 @@
+import logging
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from lib.internal.service.drive_sync_service import SyncManifest, remove_uploaded_log, sync_logs
+from lib.internal.service.upload_service import LocalDirectoryTransport, UploadError, UploadScheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class RecordingTransport(LocalDirectoryTransport):
+    # Copies into the stand-in remote unless the file is failing or the network is down, recording every attempt
+    def __init__(self, remote_path):
+        super().__init__(remote_path)
+        self.down = False
+        self.failing = set()
+        self.lock = threading.Lock()
+        self.attempts = []
+        self.uploaded = []
+
+    def upload(self, path):
+        name = os.path.basename(path)
+        with self.lock:
+            self.attempts.append(name)
+        if self.down or name in self.failing:
+            raise UploadError("network unreachable")
+        super().upload(path)
+        with self.lock:
+            self.uploaded.append(name)
+
+
+class RecordingScheduler(UploadScheduler):
+    # Records the files in the order the workers pick them, which is decided under the scheduler's lock
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.picked = []
+
+    def next_upload(self, now):
+        upload, wait = super().next_upload(now)
+        if upload is not None:
+            self.picked.append(upload.name)
+        return upload, wait
+
+
+class DriveConfig:
+    Compression = None
+
+    def __init__(self, local_log_path):
+        self.LocalLogPath = local_log_path
+
+
+class UploadSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.local = os.path.join(self.directory, "logs")
+        self.remote = os.path.join(self.directory, "remote")
+        os.makedirs(self.local)
+        self.manifest = SyncManifest(os.path.join(self.directory, "manifest.json"))
+        self.logger = logging.getLogger("test_upload_service")
+        self.clock = FakeClock()
+        self.scheduler = None
+        # No jitter, so every backoff is exactly initial_backoff doubling up to max_backoff
+        patcher = mock.patch.object(random, "uniform", return_value=1.0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        if self.scheduler is not None:
+            self.scheduler.stop()
+        shutil.rmtree(self.directory)
+
+    def write_log(self, name, mtime, data=b"line\n" * 100):
+        path = os.path.join(self.local, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def start(self, workers=2, initial_backoff=10.0, max_backoff=40.0):
+        self.transport = RecordingTransport(self.remote)
+
+        def on_uploaded(name):
+            remove_uploaded_log(self.local, name, self.manifest)
+        self.scheduler = RecordingScheduler(self.local, self.transport, self.manifest, self.logger, workers,
+                                            initial_backoff, max_backoff, on_uploaded, clock=self.clock)
+        self.scheduler.start()
+        return self.transport
+
+    def sync(self):
+        count = sync_logs(DriveConfig(self.local), self.scheduler)
+        self.settle()
+        return count
+
+    def settle(self):
+        # Waits until no upload runs and none is due at the clock's current time; the deadline only guards a hang
+        deadline = time.monotonic() + 10
+        with self.scheduler.condition:
+            while self.scheduler.in_flight or UploadScheduler.next_upload(self.scheduler, self.clock())[0] is not None:
+                self.assertLess(time.monotonic(), deadline, "upload workers did not settle")
+                self.scheduler.condition.wait(0.01)
+
+    def advance(self, seconds):
+        with self.scheduler.condition:
+            self.clock.now += seconds
+            self.scheduler.condition.notify_all()
+        self.settle()
+
+    def attempts_of(self, name):
+        return self.transport.attempts.count(name)
+
+    def test_failed_file_backs_off_while_newer_files_go_ahead(self):
+        names = [f"2022100{index}_skyla1.log" for index in range(4)]
+        for index, name in enumerate(names):
+            self.write_log(name, 1000 + index)
+        transport = self.start()
+        transport.failing.add(names[0])
+        self.sync()
+        self.assertEqual(sorted(transport.uploaded), names[1:])
+        self.assertEqual(self.attempts_of(names[0]), 1)
+        # One bad file does not hold back the queue: a new file goes straight ahead
+        self.assertEqual(self.scheduler.paused_until, 0.0)
+        self.write_log("20221004_skyla1.log", 1004)
+        self.sync()
+        self.assertEqual(transport.uploaded[-1], "20221004_skyla1.log")
+        self.assertEqual(self.attempts_of(names[0]), 1)
+
+        # 10s doubling up to 40s
+        for backoff in (10.0, 20.0, 40.0, 40.0):
+            attempts = self.attempts_of(names[0])
+            self.advance(backoff - 1)
+            self.assertEqual(self.attempts_of(names[0]), attempts)
+            self.advance(1)
+            self.assertEqual(self.attempts_of(names[0]), attempts + 1)
+        self.assertIn(names[0], self.scheduler.pending)
+
+        transport.failing.clear()
+        self.advance(40)
+        self.assertTrue(self.scheduler.idle())
+        self.assertEqual(os.listdir(self.local), [])
+
+    def test_outage_pauses_queue_to_one_probe_at_a_time(self):
+        names = [f"2022100{index}_skyla1.log" for index in range(6)]
+        for index, name in enumerate(names):
+            self.write_log(name, 1000 + index)
+        transport = self.start(workers=3)
+        transport.down = True
+        self.sync()
+
+        # The second file to fail pauses the queue; only uploads already started by then were tried
+        attempts = len(transport.attempts)
+        self.assertGreaterEqual(attempts, 2)
+        self.assertLessEqual(attempts, 4)
+        self.assertEqual(len(set(transport.attempts)), attempts)
+
+        pauses = []
+        for _ in range(5):
+            pause = self.scheduler.paused_until - self.clock()
+            pauses.append(pause)
+            ready = [upload for upload in self.scheduler.pending.values()
+                     if upload.next_attempt <= self.scheduler.paused_until]
+            oldest = min(ready, key=lambda upload: (upload.stat.st_mtime_ns, upload.name)).name
+            self.advance(pause - 1)
+            self.assertEqual(len(transport.attempts), attempts)
+            self.advance(1)
+            # Exactly one probe, with the oldest file that is due
+            self.assertEqual(transport.attempts[attempts:], [oldest])
+            attempts += 1
+        self.assertEqual(pauses, sorted(pauses))
+        self.assertEqual(pauses[-1], 40.0)
+        self.assertEqual(transport.uploaded, [])
+        self.assertEqual(len(os.listdir(self.local)), 6)
+
+    def test_backlog_drains_oldest_first_after_recovery(self):
+        names = [f"2022100{index}_skyla1.log" for index in range(8)] + ["skyla1.log"]
+        for index, name in enumerate(names):
+            self.write_log(name, 1000 + index)
+        transport = self.start(workers=3)
+        transport.down = True
+        self.sync()
+        for _ in range(3):
+            self.advance(self.scheduler.paused_until - self.clock())
+
+        transport.down = False
+        picked = len(self.scheduler.picked)
+        self.advance(self.scheduler.paused_until - self.clock())
+        self.assertTrue(self.scheduler.idle())
+
+        drained = self.scheduler.picked[picked:]
+        # The first pick after recovery is the probe that was due; everything after it goes oldest first
+        self.assertEqual(drained[1:], [name for name in names if name != drained[0]])
+        self.assertEqual(sorted(os.listdir(self.remote)), sorted(names))
+
+    def test_rotated_log_deleted_only_after_manifest_confirms_upload(self):
+        rotated = "20221003_skyla1.log"
+        self.write_log(rotated, 1000)
+        self.write_log("skyla1.log", 2000)
+        transport = self.start(workers=1)
+        transport.failing.add(rotated)
+
+        seen = {}
+        upload = transport.upload
+
+        def checking_upload(path):
+            name = os.path.basename(path)
+            # Still there and not yet in the manifest while its upload runs
+            seen[name] = (os.path.exists(path), name in self.manifest.entries)
+            upload(path)
+        transport.upload = checking_upload
+
+        self.sync()
+        self.assertTrue(os.path.exists(os.path.join(self.local, rotated)))
+        self.assertNotIn(rotated, self.manifest.entries)
+
+        transport.failing.clear()
+        self.advance(10)
+        self.assertTrue(self.scheduler.idle())
+        self.assertEqual(seen[rotated], (True, False))
+        self.assertFalse(os.path.exists(os.path.join(self.local, rotated)))
+        self.assertNotIn(rotated, self.manifest.entries)
+        self.assertTrue(os.path.exists(os.path.join(self.remote, rotated)))
+        # The live log is kept and recorded as uploaded
+        self.assertTrue(os.path.exists(os.path.join(self.local, "skyla1.log")))
+        self.assertIn("skyla1.log", SyncManifest(self.manifest.path).entries)
+
+    def test_log_changed_during_upload_is_not_deleted(self):
+        rotated = "20221003_skyla1.log"
+        path = self.write_log(rotated, 1000)
+        transport = self.start(workers=1)
+        upload = transport.upload
+
+        def appending_upload(upload_path):
+            upload(upload_path)
+            with open(upload_path, 'ab') as f:
+                f.write(b"late line\n")
+        transport.upload = appending_upload
+
+        self.sync()
+        self.assertTrue(self.scheduler.idle())
+        # The manifest holds what was uploaded, which no longer matches the file
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(self.sync(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()